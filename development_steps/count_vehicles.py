@@ -1,7 +1,15 @@
+import json
+import os
+import sys
+
 import cv2
 from ultralytics import YOLO
 import numpy as np
 
+# The counting engine lives in src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from line_counter import CountingLine, LineCounter
+
 # --- Configuration ---
 VIDEO_SOURCE ="C:/Users/sehra/OneDrive/Documents/SERIOUS STUFF   (RAM)/TRAFFIC ANALYSER (LIGHTS)/venv/sample.mp4 "   # <--- Change this to your video's filename
 OUTPUT_FILENAME = "output_counted_video.mp4"
@@ -11,14 +19,17 @@ OUTPUT_FILENAME = "output_counted_video.mp4"
 # To find a good Y-value, open your video and guess a pixel height for your line.
 LINE_Y_COORDINATE = 360 
 
-# Load the pre-trained YOLOv8 model
-model = YOLO("yolov8n.pt")
+# Headless mode: no drawing and no windows, only per-frame results in RESULTS_FILENAME.
+# VIDEO_EVERY_N_FRAMES > 0 still writes every Nth annotated frame to OUTPUT_FILENAME.
+HEADLESS = False
+RESULTS_FILENAME = "output_counted_results.jsonl"
+VIDEO_EVERY_N_FRAMES = 0
 
-# A dictionary to store the last known position of each tracked object
-track_history = {}
+# Tracks not seen for this many frames are forgotten, so memory stays flat on long feeds
+MAX_MISSING_FRAMES = 60
 
-# A set to store the IDs of vehicles that have already been counted
-counted_ids = set()
+# Load the pre-trained YOLOv8 model
+model = YOLO("yolov8n.pt")
 
 # ---------------------
 
@@ -32,9 +43,19 @@ frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
 frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 fps = int(cap.get(cv2.CAP_PROP_FPS))
 fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-out = cv2.VideoWriter(OUTPUT_FILENAME, fourcc, fps, (frame_width, frame_height))
+# The counting engine keeps the last position of each track and which tracks were counted
+counter = LineCounter([CountingLine("line", (0, LINE_Y_COORDINATE), (frame_width, LINE_Y_COORDINATE))],
+                      max_missing_frames=MAX_MISSING_FRAMES)
+
+out = None
+if not HEADLESS:
+    out = cv2.VideoWriter(OUTPUT_FILENAME, fourcc, fps, (frame_width, frame_height))
+elif VIDEO_EVERY_N_FRAMES > 0:
+    out = cv2.VideoWriter(OUTPUT_FILENAME, fourcc, max(1, fps // VIDEO_EVERY_N_FRAMES), (frame_width, frame_height))
+results_file = open(RESULTS_FILENAME, "w") if HEADLESS else None
 
 vehicle_counter = 0
+frame_index = 0
 
 # 3. The Main Loop
 while cap.isOpened():
@@ -43,7 +64,7 @@ while cap.isOpened():
         break
 
     # *** THE KEY CHANGE: Use model.track() instead of model.predict() ***
-    results = model.track(frame, persist=True)
+    results = model.track(frame, persist=True, verbose=not HEADLESS)
     
     # Get the bounding boxes and track IDs
     try:
@@ -51,32 +72,39 @@ while cap.isOpened():
         track_ids = results[0].boxes.id.int().cpu().tolist() # Vehicle IDs
     except AttributeError:
         # If no objects are tracked, boxes and track_ids will be None
-        track_ids = []
+        boxes, track_ids = [], []
+
+    # Only draw on the frames that will actually be shown or written
+    draw = not HEADLESS or (VIDEO_EVERY_N_FRAMES > 0 and frame_index % VIDEO_EVERY_N_FRAMES == 0)
 
     # Draw the counting line on the frame
-    cv2.line(frame, (0, LINE_Y_COORDINATE), (frame_width, LINE_Y_COORDINATE), (0, 255, 0), 2)
-
-    for box, track_id in zip(boxes, track_ids):
-        x, y, w, h = box
-        center_y = int(y) # The Y-coordinate of the center of the box
-
-        # Check if the vehicle is new to the tracker
-        if track_id not in track_history:
-            track_history[track_id] = center_y
-            continue
-
-        # Get the previous position and update the history
-        prev_y = track_history[track_id]
-        track_history[track_id] = center_y
-
-        # THE COUNTING LOGIC: Check for a crossing
-        # If a vehicle was above the line and is now below it, count it!
-        if prev_y < LINE_Y_COORDINATE and center_y >= LINE_Y_COORDINATE and track_id not in counted_ids:
-            vehicle_counter += 1
-            counted_ids.add(track_id)
+    if draw:
+        cv2.line(frame, (0, LINE_Y_COORDINATE), (frame_width, LINE_Y_COORDINATE), (0, 255, 0), 2)
+
+    # THE COUNTING LOGIC: every track is checked against the line at once.
+    # A vehicle that was above the line and is now below it is counted (once).
+    centers = boxes[:, :2].numpy() if len(track_ids) else np.empty((0, 2))
+    crossings = counter.update(frame_index, track_ids, centers)
+    vehicle_counter = int(counter.counts[0, 0])
+
+    if draw:
+        centers_by_id = dict(zip(track_ids, centers))
+        for track_id, _, _ in crossings:
             # Draw a circle on the vehicle as it's counted
+            x, y = centers_by_id[track_id]
             cv2.circle(frame, (int(x), int(y)), 5, (0, 0, 255), -1)
 
+    if results_file is not None:
+        results_file.write(json.dumps({
+            "frame_index": frame_index,
+            "tracked_vehicles": len(track_ids),
+            "vehicles_counted": vehicle_counter,
+        }) + "\n")
+    frame_index += 1
+
+    if not draw:
+        continue
+
     # Display the running count on the frame
     cv2.putText(frame, f"Vehicles Counted: {vehicle_counter}", (50, 50), 
                 cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
@@ -93,7 +121,11 @@ while cap.isOpened():
                 cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
 
 
-    out.write(final_frame)
+    if out is not None:
+        out.write(final_frame)
+    if HEADLESS:
+        continue
+
     cv2.imshow("Vehicle Counting", final_frame)
 
     if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -101,6 +133,10 @@ while cap.isOpened():
 
 # 4. Cleanup
 cap.release()
-out.release()
-cv2.destroyAllWindows()
+if out is not None:
+    out.release()
+if results_file is not None:
+    results_file.close()
+if not HEADLESS:
+    cv2.destroyAllWindows()
 print(f"Final vehicle count: {vehicle_counter}")
\ No newline at end of file
@@ -1,12 +1,29 @@
+import json
+import os
+import sys
+
 import cv2
 import numpy as np
 from ultralytics import YOLO
-from collections import defaultdict
+
+# The zone engine lives in src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from queue_zones import ZoneMap, full_frame_zone, load_zones
 
 # --- Configuration ---
 VIDEO_SOURCE = "C:/Users/sehra/OneDrive/Documents/SERIOUS STUFF   (RAM)/TRAFFIC ANALYSER (LIGHTS)/venv/sample.mp4"   
 OUTPUT_FILENAME = "output_queue_video.mp4"
 
+# Per-lane queue zones, see queue_zones.load_zones() for the format.
+# If the file does not exist, one zone covering the whole frame is used.
+QUEUE_ZONES_FILE = "queue_zones.json"
+
+# Headless mode: no drawing and no windows, only per-frame results in RESULTS_FILENAME.
+# VIDEO_EVERY_N_FRAMES > 0 still writes every Nth annotated frame to OUTPUT_FILENAME.
+HEADLESS = False
+RESULTS_FILENAME = "output_queue_results.jsonl"
+VIDEO_EVERY_N_FRAMES = 0
+
 # Load the YOLOv8 model
 model = YOLO("yolov8n.pt")
 
@@ -21,65 +38,78 @@ frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
 frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 fps = int(cap.get(cv2.CAP_PROP_FPS))
 fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-out = cv2.VideoWriter(OUTPUT_FILENAME, fourcc, fps, (frame_width, frame_height))
-
-# Define the polygon covering the whole frame
-QUEUE_ZONE_POLYGON = np.array([
-    [0, 0],                          # Top-left
-    [frame_width, 0],                # Top-right
-    [frame_width, frame_height],     # Bottom-right
-    [0, frame_height]                # Bottom-left
-], np.int32)
+out = None
+if not HEADLESS:
+    out = cv2.VideoWriter(OUTPUT_FILENAME, fourcc, fps, (frame_width, frame_height))
+elif VIDEO_EVERY_N_FRAMES > 0:
+    out = cv2.VideoWriter(OUTPUT_FILENAME, fourcc, max(1, fps // VIDEO_EVERY_N_FRAMES), (frame_width, frame_height))
+results_file = open(RESULTS_FILENAME, "w") if HEADLESS else None
+
+# Load the lane zones and rasterise them once into a label mask
+if os.path.exists(QUEUE_ZONES_FILE):
+    zones = load_zones(QUEUE_ZONES_FILE)
+else:
+    zones = full_frame_zone(frame_width, frame_height)
+zone_map = ZoneMap(zones, frame_width, frame_height)
 
 # Vehicle classes in COCO dataset
 VEHICLE_CLASSES = [2, 3, 5, 7]  # car, motorcycle, bus, truck
 
 # 2. Main Loop
+frame_index = 0
 while cap.isOpened():
     ret, frame = cap.read()
     if not ret:
         break
 
-    results = model.track(frame, persist=True)
-    
-    final_frame = frame.copy() # Start with a clean frame
-    
-    # Draw the queue zone overlay
-    overlay = frame.copy()
-    cv2.fillPoly(overlay, [QUEUE_ZONE_POLYGON], (0, 255, 0))  # Green overlay
-    final_frame = cv2.addWeighted(overlay, 0.3, final_frame, 0.7, 0)
+    results = model.track(frame, persist=True, verbose=not HEADLESS)
 
-    current_frame_queue_ids = set()
+    track_ids, boxes = np.empty(0), np.empty((0, 4))
     
     # Make sure we have tracking results
     if results[0].boxes is not None and results[0].boxes.id is not None:
-        boxes = results[0].boxes.xywh.cpu()
-        track_ids = results[0].boxes.id.int().cpu().tolist()
-        class_ids = results[0].boxes.cls.int().cpu().tolist()  # class IDs for filtering
-        
-        for box, track_id, cls_id in zip(boxes, track_ids, class_ids):
-            x, y, w, h = box
-            center_point = (int(x), int(y))
-
-            # Check if detection is inside polygon
-            is_inside = cv2.pointPolygonTest(QUEUE_ZONE_POLYGON, center_point, False)
-
-            # ✅ Only count vehicles
-            if is_inside > 0 and cls_id in VEHICLE_CLASSES:
-                current_frame_queue_ids.add(track_id)
-
-                # Debug print (optional, remove later)
-                print(f"Counted: Track {track_id}, Class ID {cls_id}")
-
-    # Display queue length
-    queue_length = len(current_frame_queue_ids)
+        class_ids = results[0].boxes.cls.int().cpu().numpy()  # class IDs for filtering
+
+        # ✅ Only count vehicles
+        is_vehicle = np.isin(class_ids, VEHICLE_CLASSES)
+        boxes = results[0].boxes.xywh.cpu().numpy()[is_vehicle]
+        track_ids = results[0].boxes.id.int().cpu().numpy()[is_vehicle]
+
+    # Every vehicle is assigned to its lane with one lookup in the label mask.
+    # Video time is used for dwell so recordings give the same result at any speed.
+    lane_stats = zone_map.update(track_ids, boxes, now=frame_index / max(fps, 1))
+    queue_length = sum(lane["queue_length"] for lane in lane_stats)
+
+    if results_file is not None:
+        results_file.write(json.dumps({
+            "frame_index": frame_index,
+            "queue_length": queue_length,
+            "lanes": lane_stats,
+        }) + "\n")
+    draw = not HEADLESS or (VIDEO_EVERY_N_FRAMES > 0 and frame_index % VIDEO_EVERY_N_FRAMES == 0)
+    frame_index += 1
+    if not draw:
+        continue
+
+    # Draw the precomputed queue zone overlay
+    final_frame = zone_map.draw(frame)
+
+    # Display queue length, total and per lane
     text = f"Current Queue Length: {queue_length}"
     cv2.putText(final_frame, text, (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)  # black text
+    if len(lane_stats) > 1:
+        for i, lane in enumerate(lane_stats):
+            text = f"{lane['lane']}: {lane['queue_length']} ({lane['occupancy']:.0%}, {lane['max_dwell']:.0f}s)"
+            cv2.putText(final_frame, text, (50, 90 + 30 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
     
     # Add the YOLO annotations to our frame
     final_frame = results[0].plot(img=final_frame)
 
-    out.write(final_frame)
+    if out is not None:
+        out.write(final_frame)
+    if HEADLESS:
+        continue
+
     cv2.imshow("Queue Measurement", final_frame)
 
     if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -87,5 +117,9 @@ while cap.isOpened():
 
 # 3. Cleanup
 cap.release()
-out.release()
-cv2.destroyAllWindows()
+if out is not None:
+    out.release()
+if results_file is not None:
+    results_file.close()
+if not HEADLESS:
+    cv2.destroyAllWindows()
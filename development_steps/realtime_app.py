@@ -1,6 +1,14 @@
+import json
+import os
+import sys
+
 import cv2
 from ultralytics import YOLO
 
+# The stateful recommendation engine lives in src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from recommendation import SmoothedRecommender
+
 # --- Configuration ---
 # To use a webcam, set VIDEO_SOURCE = 0
 # To use a video file, set VIDEO_SOURCE = "path/to/your/video.mp4"
@@ -10,6 +18,13 @@ VIDEO_SOURCE = 0
 # --- Recommendation Engine Thresholds ---
 LOW_THRESHOLD = 5
 HIGH_THRESHOLD = 10
+# Smoothing, hysteresis and minimum dwell, so one missed detection does not flip the decision
+SMOOTHING_SECONDS = 3.0
+HYSTERESIS_MARGIN = 1.0
+MIN_DWELL_SECONDS = 10.0
+
+# Headless mode: no drawing and no windows, one JSON line on stdout per decision change
+HEADLESS = False
 
 # Load the YOLOv8 model
 MODEL = YOLO("yolov8n.pt")
@@ -22,6 +37,10 @@ if not cap.isOpened():
     print(f"Error: Could not open video source at {VIDEO_SOURCE}")
     exit()
 
+recommender = SmoothedRecommender(LOW_THRESHOLD, HIGH_THRESHOLD, SMOOTHING_SECONDS,
+                                  HYSTERESIS_MARGIN, MIN_DWELL_SECONDS)
+STATUS_COLORS = {"Light Traffic": (0, 255, 0), "Moderate Traffic": (0, 255, 255), "Heavy Traffic": (0, 0, 255)}
+
 # 2. Main Loop
 while True:
     # Read a frame from the video
@@ -31,9 +50,7 @@ while True:
         break
 
     # Run YOLOv8 tracking on the frame
-    results = MODEL.track(frame, persist=True)
-    
-    final_frame = frame.copy()
+    results = MODEL.track(frame, persist=True, verbose=not HEADLESS)
 
     # --- Analysis Logic ---
     current_frame_vehicle_ids = set()
@@ -50,14 +67,21 @@ while True:
     vehicle_count = len(current_frame_vehicle_ids)
     
     # --- Recommendation Logic ---
-    if vehicle_count <= LOW_THRESHOLD:
-        status, recommendation, color = "Light Traffic", "Set Green Time: 20s", (0, 255, 0) # Green
-    elif vehicle_count <= HIGH_THRESHOLD:
-        status, recommendation, color = "Moderate Traffic", "Set Green Time: 45s", (0, 255, 255) # Yellow
-    else:
-        status, recommendation, color = "Heavy Traffic", "Set Green Time: 60s", (0, 0, 255) # Red
+    # Smoothed over the last few seconds; only changes when the trend does
+    changed = recommender.update(vehicle_count) is not None
+    status, green_seconds = recommender.current()
+    recommendation = f"Set Green Time: {green_seconds}s"
+    color = STATUS_COLORS[status]
+
+    if HEADLESS:
+        if changed:
+            print(json.dumps({"vehicle_count": vehicle_count, "status": status, "recommendation": recommendation}),
+                  flush=True)
+        continue
         
     # --- Drawing ---
+    final_frame = frame.copy()
+
     # Draw YOLO annotations first
     final_frame = results[0].plot(img=final_frame)
 
@@ -79,5 +103,6 @@ while True:
 
 # 3. Cleanup
 cap.release()
-cv2.destroyAllWindows()
+if not HEADLESS:
+    cv2.destroyAllWindows()
 print("Analysis stopped and windows closed.")
\ No newline at end of file
@@ -1,7 +1,15 @@
+import json
+import os
+import sys
+
 import cv2
 import numpy as np
 from ultralytics import YOLO
 
+# The stateful recommendation engine lives in src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from recommendation import SmoothedRecommender
+
 # --- This print statement confirms you are running the new version ---
 print("--- Running script with Recommendation Engine ---")
 
@@ -14,6 +22,16 @@ OUTPUT_FILENAME = "output_recommendation.mp4"
 # You can tune these values based on your video
 LOW_THRESHOLD = 5
 HIGH_THRESHOLD = 10
+# Smoothing, hysteresis and minimum dwell, so one missed detection does not flip the decision
+SMOOTHING_SECONDS = 3.0
+HYSTERESIS_MARGIN = 1.0
+MIN_DWELL_SECONDS = 10.0
+
+# Headless mode: no drawing and no windows, only per-frame results in RESULTS_FILENAME.
+# VIDEO_EVERY_N_FRAMES > 0 still writes every Nth annotated frame to OUTPUT_FILENAME.
+HEADLESS = False
+RESULTS_FILENAME = "output_recommendation_results.jsonl"
+VIDEO_EVERY_N_FRAMES = 0
 
 # Load the YOLOv8 model
 model = YOLO("yolov8n.pt")
@@ -32,17 +50,25 @@ fps = int(cap.get(cv2.CAP_PROP_FPS))
 # 2. Define the full-screen zone and video writer
 ZONE_POLYGON = np.array([[0, 0], [frame_width, 0], [frame_width, frame_height], [0, frame_height]], np.int32)
 fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-out = cv2.VideoWriter(OUTPUT_FILENAME, fourcc, fps, (frame_width, frame_height))
+out = None
+if not HEADLESS:
+    out = cv2.VideoWriter(OUTPUT_FILENAME, fourcc, fps, (frame_width, frame_height))
+elif VIDEO_EVERY_N_FRAMES > 0:
+    out = cv2.VideoWriter(OUTPUT_FILENAME, fourcc, max(1, fps // VIDEO_EVERY_N_FRAMES), (frame_width, frame_height))
+results_file = open(RESULTS_FILENAME, "w") if HEADLESS else None
+
+recommender = SmoothedRecommender(LOW_THRESHOLD, HIGH_THRESHOLD, SMOOTHING_SECONDS,
+                                  HYSTERESIS_MARGIN, MIN_DWELL_SECONDS)
+STATUS_COLORS = {"Light Traffic": (0, 255, 0), "Moderate Traffic": (0, 255, 255), "Heavy Traffic": (0, 0, 255)}
 
 # 3. Main Loop
+frame_index = 0
 while cap.isOpened():
     ret, frame = cap.read()
     if not ret:
         break
 
-    results = model.track(frame, persist=True)
-    
-    final_frame = frame.copy() 
+    results = model.track(frame, persist=True, verbose=not HEADLESS)
     
     current_frame_vehicle_ids = set()
     if results[0].boxes is not None and results[0].boxes.id is not None:
@@ -58,22 +84,27 @@ while cap.isOpened():
     vehicle_count = len(current_frame_vehicle_ids)
     
     # --- RECOMMENDATION LOGIC ---
-    status = "Unknown"
-    recommendation = "No recommendation"
-    color = (255, 255, 255) # White
-
-    if vehicle_count <= LOW_THRESHOLD:
-        status = "Light Traffic"
-        recommendation = "Set Green Time: 20s"
-        color = (0, 255, 0) # Green
-    elif vehicle_count <= HIGH_THRESHOLD:
-        status = "Moderate Traffic"
-        recommendation = "Set Green Time: 45s"
-        color = (0, 255, 255) # Yellow
-    else:
-        status = "Heavy Traffic"
-        recommendation = "Set Green Time: 60s"
-        color = (0, 0, 255) # Red
+    # The smoothed level only changes when the trend does (video time, in seconds)
+    changed = recommender.update(vehicle_count, now=frame_index / max(fps, 1)) is not None
+    status, green_seconds = recommender.current()
+    recommendation = f"Set Green Time: {green_seconds}s"
+    color = STATUS_COLORS[status]
+
+    if results_file is not None:
+        results_file.write(json.dumps({
+            "frame_index": frame_index,
+            "vehicle_count": vehicle_count,
+            "smoothed_count": round(recommender.smoothed, 2),
+            "status": status,
+            "recommendation": recommendation,
+            "changed": changed,
+        }) + "\n")
+    draw = not HEADLESS or (VIDEO_EVERY_N_FRAMES > 0 and frame_index % VIDEO_EVERY_N_FRAMES == 0)
+    frame_index += 1
+    if not draw:
+        continue
+
+    final_frame = frame.copy() 
         
     # Draw the YOLO annotations first
     final_frame = results[0].plot(img=final_frame)
@@ -86,7 +117,11 @@ while cap.isOpened():
     cv2.putText(final_frame, f"Recommendation: {recommendation}", (50, 130), 
                 cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
 
-    out.write(final_frame)
+    if out is not None:
+        out.write(final_frame)
+    if HEADLESS:
+        continue
+
     cv2.imshow("Traffic Recommendation Engine", final_frame)
 
     if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -94,5 +129,9 @@ while cap.isOpened():
 
 # 4. Cleanup
 cap.release()
-out.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+if out is not None:
+    out.release()
+if results_file is not None:
+    results_file.close()
+if not HEADLESS:
+    cv2.destroyAllWindows()
\ No newline at end of file
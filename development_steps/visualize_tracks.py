@@ -1,6 +1,12 @@
+import os
+import sys
+
 import cv2
 from ultralytics import YOLO
-from collections import defaultdict
+
+# The track store lives in src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from track_store import TrackStore
 
 # --- Configuration ---
 VIDEO_SOURCE = "C:/Users/sehra/OneDrive/Documents/SERIOUS STUFF   (RAM)/TRAFFIC ANALYSER (LIGHTS)/venv/sample.mp4 "   # <--- Change this to your video's filename
@@ -9,9 +15,9 @@ OUTPUT_FILENAME = "output_tracked_video.mp4"
 # Load the pre-trained YOLOv8 model
 model = YOLO("yolov8n.pt")
 
-# A dictionary to store the tracking history (the path) of each object
-# The key will be the track ID, and the value will be a list of center points
-track_history = defaultdict(lambda: [])
+# Stores the tracking history (the path) of each object in fixed-size ring buffers.
+# Keep the last 30 points per track, and forget tracks not seen for 2 seconds.
+track_history = TrackStore(history_length=30, max_age_seconds=2.0)
 
 # ---------------------
 
@@ -28,6 +34,7 @@ fourcc = cv2.VideoWriter_fourcc(*'mp4v')
 out = cv2.VideoWriter(OUTPUT_FILENAME, fourcc, fps, (frame_width, frame_height))
 
 # 3. The Main Loop
+frame_index = 0
 while cap.isOpened():
     ret, frame = cap.read()
     if not ret:
@@ -41,7 +48,12 @@ while cap.isOpened():
         boxes = results[0].boxes.xywh.cpu()
         track_ids = results[0].boxes.id.int().cpu().tolist()
     except AttributeError:
-        track_ids = []
+        boxes, track_ids = [], []
+
+    # Append the new center points to the tracking history (video time, in seconds)
+    now = frame_index / max(fps, 1)
+    frame_index += 1
+    track_history.update(track_ids, boxes[:, :2].numpy() if len(track_ids) else [], now)
 
     # Get the annotated frame from YOLO which has the boxes drawn on it
     annotated_frame = results[0].plot()
@@ -50,23 +62,12 @@ while cap.isOpened():
     for box, track_id in zip(boxes, track_ids):
         x, y, w, h = box
         center_x, center_y = int(x), int(y)
+
+        # Draw the tracking line (the trail) in one call
+        cv2.polylines(annotated_frame, [track_history.trail(track_id)], False, (0, 255, 0), 2)
         
-        # Append the new center point to this object's tracking history
-        track = track_history[track_id]
-        track.append((center_x, center_y))
-        
-        # Keep the track history to a certain length to avoid long trails
-        if len(track) > 30:  # You can adjust this number
-            track.pop(0)
-
-        # Draw the tracking lines (the trail)
-        if len(track) > 1:
-            for i in range(1, len(track)):
-                # Draw a line between the last two points
-                cv2.line(annotated_frame, track[i - 1], track[i], (0, 255, 0), 2)
-        
-        # Display the Track ID next to the bounding box
-        id_text = f"ID: {track_id}"
+        # Display the Track ID and its current speed next to the bounding box
+        id_text = f"ID: {track_id} {track_history.speed(track_id):.0f}px/s"
         cv2.putText(annotated_frame, id_text, (center_x, center_y - 15), 
                     cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
 
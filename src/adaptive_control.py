@@ -0,0 +1,94 @@
+import math
+import time
+
+# --- Configuration ---
+# Quality ladder from best to cheapest: (general model image size, frame stride).
+# Image sizes must be multiples of 32; a stride of 2 runs the general model on
+# every other frame of each stream.
+QUALITY_LEVELS = [(640, 1), (512, 1), (416, 1), (320, 1), (320, 2), (320, 3)]
+# Capture-to-decision latency the pipeline should stay within
+LATENCY_BUDGET_SECONDS = 0.25
+# Step back up only when latency is below this fraction of the budget
+HEADROOM_FRACTION = 0.6
+# Fraction of the frame queues that may be filled before it counts as falling behind
+BACKLOG_HIGH_WATER = 0.75
+# Time constant of the latency average, and minimum time between two changes
+SMOOTHING_SECONDS = 1.0
+COOLDOWN_SECONDS = 2.0
+
+# ---------------------
+
+
+class AdaptiveController:
+    """
+    Trades general-model quality for speed when the pipeline falls behind.
+
+    Fed once per batch with the worst capture-to-decision latency and the
+    fill level of the frame queues, it walks QUALITY_LEVELS one step at a
+    time: down when the smoothed latency exceeds the budget or the queues
+    back up, up again once there is clear headroom. Changes are at least
+    cooldown_seconds apart, so the level does not oscillate.
+
+    Only the general model is degraded; the ambulance model always runs at
+    its full input size.
+    """
+
+    def __init__(self, latency_budget=LATENCY_BUDGET_SECONDS, levels=QUALITY_LEVELS,
+                 headroom_fraction=HEADROOM_FRACTION, backlog_high_water=BACKLOG_HIGH_WATER,
+                 smoothing_seconds=SMOOTHING_SECONDS, cooldown_seconds=COOLDOWN_SECONDS):
+        self.latency_budget = latency_budget
+        self.levels = levels
+        self.headroom_fraction = headroom_fraction
+        self.backlog_high_water = backlog_high_water
+        self.smoothing_seconds = smoothing_seconds
+        self.cooldown_seconds = cooldown_seconds
+
+        self.level = 0
+        self.latency = None
+        self.last_update = None
+        self.changed_at = None
+        self.changes = 0
+
+    @property
+    def imgsz(self):
+        return self.levels[self.level][0]
+
+    @property
+    def stride(self):
+        return self.levels[self.level][1]
+
+    def should_infer(self, frames_since_general):
+        """
+        Whether the general model runs on a frame at the current stride, given
+        the frames of its stream delivered since the model last ran on it (this
+        one included). Capture indices would starve live sources that drop frames.
+        """
+        return frames_since_general >= self.stride
+
+    def update(self, latency, backlog=0.0, now=None):
+        """
+        Feed the latest latency (seconds) and queue fill level (0..1).
+        Returns the new (imgsz, stride) if the level changed, else None.
+        """
+        now = time.monotonic() if now is None else now
+        if self.latency is None:
+            self.latency = latency
+        else:
+            alpha = 1.0 - math.exp(-max(0.0, now - self.last_update) / self.smoothing_seconds)
+            self.latency += alpha * (latency - self.latency)
+        self.last_update = now
+
+        if self.changed_at is not None and now - self.changed_at < self.cooldown_seconds:
+            return None
+        level = self.level
+        if self.latency > self.latency_budget or backlog >= self.backlog_high_water:
+            level = min(level + 1, len(self.levels) - 1)
+        elif self.latency < self.latency_budget * self.headroom_fraction and backlog < self.backlog_high_water / 2:
+            level = max(level - 1, 0)
+        if level == self.level:
+            return None
+
+        self.level = level
+        self.changed_at = now
+        self.changes += 1
+        return self.levels[level]
@@ -0,0 +1,65 @@
+import time
+
+# --- Configuration ---
+# Largest number of frames sent to a model in one call
+MAX_BATCH_SIZE = 8
+# How long to wait for more frames once the first one of a batch arrived
+MAX_WAIT_SECONDS = 0.01
+# Poll interval while waiting for frames
+POLL_SECONDS = 0.001
+
+# ---------------------
+
+
+class FrameBatcher:
+    """
+    Gathers frames from several streams into one batch.
+
+    A batch is closed when it reaches max_batch_size or when max_wait_seconds
+    have passed since its first frame, whichever comes first. Streams are
+    visited round-robin so one busy camera cannot starve the others, and
+    consecutive frames of the same stream keep their order inside a batch.
+    """
+
+    def __init__(self, streams, max_batch_size=MAX_BATCH_SIZE, max_wait_seconds=MAX_WAIT_SECONDS):
+        self.streams = streams
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+
+    def next_batch(self):
+        """Return a list of (stream, frame_index, frame, captured_at). May be empty."""
+        batch = []
+        # Until the first frame arrives, the deadline only bounds how long we idle
+        deadline = time.monotonic() + self.max_wait_seconds
+
+        while len(batch) < self.max_batch_size:
+            got_frame = False
+            for stream in self.streams:
+                if len(batch) >= self.max_batch_size:
+                    break
+                item = stream.read()
+                if item is None:
+                    continue
+                if not batch:
+                    deadline = time.monotonic() + self.max_wait_seconds
+                got_frame = True
+                batch.append((stream, *item))
+
+            if time.monotonic() >= deadline or all(stream.done for stream in self.streams):
+                break
+            if not got_frame:
+                time.sleep(POLL_SECONDS)
+
+        return batch
+
+
+def predict_batch(model, frames, max_batch_size=MAX_BATCH_SIZE, **predict_kwargs):
+    """
+    Run a model on a list of frames in as few calls as possible.
+    Returns one result per frame, in the same order.
+    """
+    results = []
+    for start in range(0, len(frames), max_batch_size):
+        chunk = frames[start:start + max_batch_size]
+        results.extend(model(chunk, verbose=False, **predict_kwargs))
+    return results
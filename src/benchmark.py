@@ -0,0 +1,222 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import cv2
+import numpy as np
+
+# --- Configuration ---
+GENERAL_MODEL_PATH = "yolov8n.pt"
+AMBULANCE_MODEL_PATH = "best.pt"
+# Synthetic clips are generated once into this directory and reused
+CLIP_DIR = "benchmark_clips"
+CLIP_FRAMES = 300
+CLIP_WIDTH = 1280
+CLIP_HEIGHT = 720
+CLIP_FPS = 30
+CLIP_SEED = 0
+STREAM_COUNTS = [1, 4]
+LATENCY_PERCENTILES = [50, 90, 99]
+# --baseline fails the run if any configuration loses more FPS than this
+REGRESSION_TOLERANCE = 0.10
+
+# ---------------------
+
+
+def make_clip(path, seed, frames=CLIP_FRAMES, width=CLIP_WIDTH, height=CLIP_HEIGHT, fps=CLIP_FPS):
+    """
+    Write a deterministic synthetic traffic clip: a grey road with lane
+    markings and coloured boxes moving at fixed speeds. The same seed always
+    gives the same clip, so runs on different days are comparable.
+    """
+    rng = np.random.default_rng(seed)
+    count = 12
+    sizes = rng.integers([60, 40], [220, 140], size=(count, 2))
+    positions = rng.uniform([0, 0], [width, height], size=(count, 2))
+    velocities = rng.uniform([-8, 2], [8, 10], size=(count, 2))
+    colors = rng.integers(0, 256, size=(count, 3))
+
+    background = np.full((height, width, 3), 90, dtype=np.uint8)
+    for x in range(width // 4, width, width // 4):
+        cv2.line(background, (x, 0), (x, height), (230, 230, 230), 4)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for _ in range(frames):
+        frame = background.copy()
+        for (w, h), (x, y), color in zip(sizes, positions, colors):
+            cv2.rectangle(frame, (int(x), int(y)), (int(x + w), int(y + h)), tuple(int(c) for c in color), -1)
+        positions = (positions + velocities) % [width, height]
+        writer.write(frame)
+    writer.release()
+
+
+def prepare_clips(count, clip_dir=CLIP_DIR, frames=CLIP_FRAMES, width=CLIP_WIDTH, height=CLIP_HEIGHT):
+    """Paths of `count` distinct synthetic clips, generated if missing."""
+    os.makedirs(clip_dir, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(clip_dir, f"synthetic_{width}x{height}_{frames}f_seed{CLIP_SEED + i}.mp4")
+        if not os.path.exists(path):
+            make_clip(path, CLIP_SEED + i, frames, width, height)
+        paths.append(path)
+    return paths
+
+
+def run_config(config, clips):
+    """
+    Run the full pipeline once over `clips` in the current process and
+    measure it. Meant to run in a fresh process, so peak RSS is this run's.
+    """
+    from metrics import PipelineMetrics
+    from model_registry import registry
+    from multi_stream import MultiStreamRunner
+
+    registry.register("general", config["general_weights"], config["backend"])
+    if config["ambulance"]:
+        registry.register("ambulance", config["ambulance_weights"], config["backend"])
+    models = registry.load()
+    general_model, ambulance_model = models["general"], models.get("ambulance")
+
+    # Warm-up is measured separately, so one-off initialisation does not skew the run
+    cap = cv2.VideoCapture(clips[0])
+    clip_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    _, frame = cap.read()
+    cap.release()
+    registry.warm_up(frame_shape=frame.shape, batch_sizes=(1, len(clips)))
+
+    metrics = PipelineMetrics(window_size=max(1, clip_frames) * len(clips))
+    video_dir = tempfile.mkdtemp(prefix="benchmark_video_") if config["annotated"] else None
+    try:
+        runner = MultiStreamRunner(clips, general_model, ambulance_model, show=False, video_dir=video_dir,
+                                   metrics=metrics, stream_kwargs={"live": False})
+        start = time.perf_counter()
+        runner.run()
+        elapsed = time.perf_counter() - start
+    finally:
+        if video_dir is not None:
+            shutil.rmtree(video_dir, ignore_errors=True)
+
+    names = [stream.name for stream in runner.streams]
+    frames = sum(metrics.counter(name, "frames") for name in names)
+    latency = np.concatenate([metrics.values(name, "capture_to_decision") for name in names])
+    stage_means = {}
+    for stage in ("capture", "preprocess", "ambulance_inference", "general_inference",
+                  "tracking", "decision", "render", "video_write"):
+        values = np.concatenate([metrics.values(name, stage) for name in names])
+        if len(values):
+            stage_means[stage] = float(values.mean())
+
+    result = dict(config)
+    result.update(
+        frames=frames,
+        seconds=elapsed,
+        fps=frames / elapsed if elapsed > 0 else 0.0,
+        latency={f"p{p}": float(v) for p, v in zip(
+            LATENCY_PERCENTILES, np.percentile(latency, LATENCY_PERCENTILES))} if len(latency) else None,
+        stage_means=stage_means,
+        dropped_frames=sum(stream.dropped_frames for stream in runner.streams),
+        models=registry.timings,
+        # ru_maxrss is in KiB on Linux
+        peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    )
+    return result
+
+
+def config_name(config):
+    return (f"{config['streams']}x_{config['backend']}_{'annotated' if config['annotated'] else 'headless'}"
+            f"_{'ambulance' if config['ambulance'] else 'general'}")
+
+
+def build_configs(stream_counts, backends, modes, ambulance_options, general_weights, ambulance_weights):
+    configs = []
+    for streams, backend, annotated, ambulance in itertools.product(
+            stream_counts, backends, modes, ambulance_options):
+        config = {"streams": streams, "backend": backend, "annotated": annotated, "ambulance": ambulance,
+                  "general_weights": general_weights, "ambulance_weights": ambulance_weights}
+        config["name"] = config_name(config)
+        configs.append(config)
+    return configs
+
+
+def environment():
+    info = {"platform": platform.platform(), "python": platform.python_version(),
+            "cpu_count": os.cpu_count(), "opencv": cv2.__version__, "numpy": np.__version__}
+    try:
+        import torch
+        info["torch"] = torch.__version__
+        info["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return info
+
+
+def compare(results, baseline_path, tolerance=REGRESSION_TOLERANCE):
+    """Print FPS against a previous results file. Returns the names of regressed configurations."""
+    with open(baseline_path) as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        old = baseline.get(result["name"])
+        if old is None or not old["fps"]:
+            continue
+        change = result["fps"] / old["fps"] - 1
+        print(f"{result['name']:45s} {old['fps']:8.2f} -> {result['fps']:8.2f} FPS ({change:+.1%})")
+        if change < -tolerance:
+            regressions.append(result["name"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detection-to-decision pipeline on synthetic clips.")
+    parser.add_argument("--streams", type=int, nargs="+", default=STREAM_COUNTS)
+    parser.add_argument("--backends", nargs="+", default=["torch"], help="Any of torch, onnx, openvino.")
+    parser.add_argument("--modes", nargs="+", choices=["headless", "annotated"], default=["headless", "annotated"])
+    parser.add_argument("--ambulance", nargs="+", choices=["on", "off"], default=["on", "off"])
+    parser.add_argument("--weights", default=GENERAL_MODEL_PATH)
+    parser.add_argument("--ambulance-weights", default=AMBULANCE_MODEL_PATH)
+    parser.add_argument("--frames", type=int, default=CLIP_FRAMES, help="Frames per synthetic clip.")
+    parser.add_argument("--size", default=f"{CLIP_WIDTH}x{CLIP_HEIGHT}", help="Clip size as WIDTHxHEIGHT.")
+    parser.add_argument("--clip-dir", default=CLIP_DIR)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Previous results file; exit with status 1 on an FPS regression.")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    clips = prepare_clips(max(args.streams), args.clip_dir, args.frames, width, height)
+    configs = build_configs(args.streams, args.backends, [mode == "annotated" for mode in args.modes],
+                            [option == "on" for option in args.ambulance], args.weights, args.ambulance_weights)
+
+    results = []
+    for config in configs:
+        # A fresh process per configuration: no shared warm caches, and a clean peak RSS
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            result = pool.submit(run_config, config, clips[:config["streams"]]).result()
+        latency = result["latency"] or {}
+        print(f"{result['name']:45s} {result['fps']:8.2f} FPS  p50 {latency.get('p50', 0) * 1000:7.1f} ms"
+              f"  p99 {latency.get('p99', 0) * 1000:7.1f} ms  peak RSS {result['peak_rss_mb']:7.1f} MB")
+        results.append(result)
+
+    with open(args.output, "w") as f:
+        json.dump({"timestamp": time.time(), "environment": environment(),
+                   "clip": {"frames": args.frames, "width": width, "height": height, "fps": CLIP_FPS,
+                            "seed": CLIP_SEED},
+                   "results": results}, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline)
+        if regressions:
+            print(f"FPS regression in: {', '.join(regressions)}")
+            exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from detector_backends import BACKENDS, export_model, load_exported
+from line_counter import CountingLine, LineCounter
+from stream_processor import HIGH_THRESHOLD, LOW_THRESHOLD, VEHICLE_CLASSES, classify_traffic
+from tracking import StreamTracker
+
+# --- Configuration ---
+GENERAL_MODEL_PATH = "yolov8n.pt"
+CONFIDENCE_THRESHOLD = 0.5
+# Long files are cut into segments of this length and processed in parallel
+SEGMENT_SECONDS = 300
+# Frames before each segment start that are run only to warm up the tracker,
+# so vehicles crossing right at a boundary are tracked (and counted once)
+WARMUP_FRAMES = 30
+
+# ---------------------
+
+# One model per worker process, loaded by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_path, backend):
+    global _worker_model
+    # One inference thread per process: the pool provides the parallelism
+    import torch
+    torch.set_num_threads(1)
+    cv2.setNumThreads(1)
+    _worker_model = load_exported(model_path, backend)
+
+
+def plan_segments(paths, segment_seconds=SEGMENT_SECONDS, warmup_frames=WARMUP_FRAMES):
+    """Split every file into (path, start_frame, end_frame, warmup_start, fps) segments."""
+    segments = []
+    for path in paths:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise IOError(f"Cannot open video file {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        step = max(1, int(segment_seconds * fps))
+        for start in range(0, total, step):
+            segments.append((path, start, min(start + step, total), max(0, start - warmup_frames), fps))
+    return segments
+
+
+def analyze_segment(segment, line=None, conf=CONFIDENCE_THRESHOLD, vehicle_classes=VEHICLE_CLASSES,
+                    low_threshold=LOW_THRESHOLD, high_threshold=HIGH_THRESHOLD):
+    """
+    Process one segment in a worker process. Returns a dict of equal-length
+    columns for the frames in [start_frame, end_frame); warm-up frames only
+    feed the tracker and the line counter.
+    """
+    path, start, end, warmup_start, fps = segment
+    model = _worker_model
+    counter = LineCounter([line]) if line is not None else None
+    # A fresh tracker per segment; model.track() would keep one tracker per
+    # model, set up with the persist value of its very first call
+    tracker = StreamTracker(frame_rate=fps)
+
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, warmup_start)
+
+    columns = {name: [] for name in ("frame_index", "timestamp", "vehicle_count", "status",
+                                     "crossings_forward", "crossings_backward")}
+    for frame_index in range(warmup_start, end):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        result = tracker.update(model.predict(frame, conf=conf, verbose=False)[0])
+
+        vehicle_count = 0
+        forward = backward = 0
+        boxes = result.boxes
+        if boxes is not None and boxes.id is not None:
+            is_vehicle = np.isin(boxes.cls.int().cpu().numpy(), vehicle_classes)
+            vehicle_count = int(is_vehicle.sum())
+            if counter is not None:
+                events = counter.update(frame_index, boxes.id.int().cpu().numpy()[is_vehicle],
+                                        boxes.xywh.cpu().numpy()[is_vehicle, :2])
+                forward = sum(1 for _, _, direction in events if direction == 0)
+                backward = len(events) - forward
+
+        if frame_index < start:
+            continue
+        status, _ = classify_traffic(vehicle_count, low_threshold, high_threshold)
+        columns["frame_index"].append(frame_index)
+        columns["timestamp"].append(frame_index / fps)
+        columns["vehicle_count"].append(vehicle_count)
+        columns["status"].append(status)
+        columns["crossings_forward"].append(forward)
+        columns["crossings_backward"].append(backward)
+    cap.release()
+
+    columns["video"] = [path] * len(columns["frame_index"])
+    return columns
+
+
+def _analyze(args):
+    segment, line, conf = args
+    return analyze_segment(segment, line, conf)
+
+
+def stitch(segment_results):
+    """
+    Concatenate per-segment columns (already in file/frame order) and add
+    running crossing totals per file, which is what a single pass would give.
+    """
+    names = ["video", "frame_index", "timestamp", "vehicle_count", "status",
+             "crossings_forward", "crossings_backward"]
+    table = {name: np.concatenate([np.asarray(r[name]) for r in segment_results]) if segment_results
+             else np.empty(0) for name in names}
+
+    for direction in ("forward", "backward"):
+        totals = np.zeros(len(table["video"]), dtype=np.int64)
+        for path in np.unique(table["video"]):
+            rows = table["video"] == path
+            totals[rows] = np.cumsum(table[f"crossings_{direction}"][rows])
+        table[f"total_{direction}"] = totals
+    return table
+
+
+def write_table(table, output):
+    """
+    Write the columns as Parquet (needs pyarrow) or as a NumPy .npz archive.
+    Without pyarrow a .parquet output falls back to .npz next to it.
+    Returns the path written.
+    """
+    if output.endswith(".parquet"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            fallback = os.path.splitext(output)[0] + ".npz"
+            print(f"Warning: pyarrow is not installed, writing {fallback} instead of {output}")
+            output = fallback
+        else:
+            pq.write_table(pa.table({name: column for name, column in table.items()}), output)
+            return output
+    np.savez_compressed(output, **table)
+    return output
+
+
+def run(paths, output, workers=None, weights=GENERAL_MODEL_PATH, backend="torch", line=None,
+        conf=CONFIDENCE_THRESHOLD, segment_seconds=SEGMENT_SECONDS):
+    segments = plan_segments(paths, segment_seconds)
+    workers = workers or os.cpu_count()
+    print(f"{len(segments)} segments from {len(paths)} file(s) on {workers} worker(s)")
+
+    # Export once here; workers exporting in parallel would write the same file
+    model_path = export_model(weights, backend)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path, backend)) as pool:
+        # map() keeps the segment order, so stitching is a plain concatenation
+        results = list(pool.map(_analyze, [(segment, line, conf) for segment in segments]))
+
+    table = stitch(results)
+    output = write_table(table, output)
+    print(f"Wrote {len(table['video'])} frames to {output}")
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze recorded footage on all cores.")
+    parser.add_argument("videos", nargs="+", help="Video files to analyze.")
+    parser.add_argument("--output", default="analysis.parquet", help=".parquet (needs pyarrow) or .npz")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: all cores).")
+    parser.add_argument("--segment-seconds", type=float, default=SEGMENT_SECONDS)
+    parser.add_argument("--weights", default=GENERAL_MODEL_PATH)
+    parser.add_argument("--backend", default="torch", choices=BACKENDS)
+    parser.add_argument("--line-y", type=int, help="Count vehicles crossing a horizontal line at this height.")
+    args = parser.parse_args()
+
+    line = None
+    if args.line_y is not None:
+        line = CountingLine("line", (0, args.line_y), (1 << 16, args.line_y))
+    run(args.videos, args.output, args.workers, args.weights, args.backend, line,
+        segment_seconds=args.segment_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import json
+import time
+
+from signal_output import CONTROLLER_HOST, CONTROLLER_PORT
+
+
+class ControllerStub(asyncio.DatagramProtocol):
+    """
+    Local stand-in for a signal controller, for testing the publisher.
+    Prints every event with its delivery latency and keeps the current
+    green time and override state per approach.
+    """
+
+    def __init__(self):
+        self.last_seq = {}
+        self.phases = {}
+        self.overrides = set()
+        self.plans = {}
+
+    def datagram_received(self, data, addr):
+        received_at = time.time()
+        event = json.loads(data)
+
+        # Override events arrive several times; act on each sequence number once
+        if event["seq"] <= self.last_seq.get(addr, 0):
+            return
+        self.last_seq[addr] = event["seq"]
+
+        latency_ms = (received_at - event["sent_at"]) * 1000
+        if event["type"] == "phase_plan":
+            self.plans[event["intersection"]] = event["greens"]
+            greens = ", ".join(f"{name} {green}s" for name, green in event["greens"].items())
+            print(f"[{latency_ms:6.2f} ms] {event['intersection']}: {event['method']} cycle {event['cycle']}s: {greens}")
+            return
+
+        key = (event["intersection"], event["approach"])
+        if event["type"] == "ambulance_override":
+            if event["state"] == "start":
+                self.overrides.add(key)
+            else:
+                self.overrides.discard(key)
+            print(f"[{latency_ms:6.2f} ms] OVERRIDE {event['state'].upper()} {key[0]}/{key[1]}")
+        elif event["type"] == "phase_change":
+            self.phases[key] = event["green_seconds"]
+            print(f"[{latency_ms:6.2f} ms] {key[0]}/{key[1]}: {event['status']}, green {event['green_seconds']}s")
+
+
+async def serve(host, port):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(ControllerStub, local_addr=(host, port))
+    print(f"Controller stub listening on {host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in signal controller that prints received events.")
+    parser.add_argument("--host", default=CONTROLLER_HOST)
+    parser.add_argument("--port", type=int, default=CONTROLLER_PORT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
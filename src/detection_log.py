@@ -0,0 +1,152 @@
+import os
+
+import numpy as np
+
+# --- Configuration ---
+LOG_MAGIC = b"TRDLOG1\0"
+
+# One fixed-width 38-byte record per detection. Every frame also gets one
+# marker record (class_id == FRAME_MARKER) so empty frames survive replay.
+DETECTION_DTYPE = np.dtype([
+    ("frame_index", "<u4"),
+    ("timestamp", "<f8"),
+    ("track_id", "<i4"),
+    ("class_id", "<u2"),
+    ("conf", "<f4"),
+    ("x1", "<f4"),
+    ("y1", "<f4"),
+    ("x2", "<f4"),
+    ("y2", "<f4"),
+], align=False)
+FRAME_MARKER = 0xFFFF
+
+# ---------------------
+
+
+class DetectionLogWriter:
+    """
+    Appends per-frame detections to a compact binary log.
+
+    An existing log is cut back to its last whole record first, so a record
+    left half-written by a crash cannot misalign everything appended after it.
+    """
+
+    def __init__(self, path):
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size >= len(LOG_MAGIC):
+            with open(path, "rb") as f:
+                if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+                    raise ValueError(f"{path} is not a detection log")
+            whole = len(LOG_MAGIC) + (size - len(LOG_MAGIC)) // DETECTION_DTYPE.itemsize * DETECTION_DTYPE.itemsize
+            if whole != size:
+                os.truncate(path, whole)
+            self.file = open(path, "ab")
+        else:
+            self.file = open(path, "wb")
+            self.file.write(LOG_MAGIC)
+
+    def write(self, frame_index, timestamp, track_ids, class_ids, confs, xyxy):
+        """Write one frame. track_ids may be None for untracked detections (stored as -1)."""
+        n = len(class_ids)
+        records = np.zeros(n + 1, dtype=DETECTION_DTYPE)
+        records["frame_index"] = frame_index
+        records["timestamp"] = timestamp
+        records["track_id"][0] = -1
+        records["class_id"][0] = FRAME_MARKER
+        if n:
+            records["track_id"][1:] = -1 if track_ids is None else np.asarray(track_ids)
+            records["class_id"][1:] = np.asarray(class_ids)
+            records["conf"][1:] = np.asarray(confs)
+            xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+            for i, name in enumerate(("x1", "y1", "x2", "y2")):
+                records[name][1:] = xyxy[:, i]
+        self.file.write(records.tobytes())
+
+    def write_result(self, frame_index, timestamp, result):
+        """Write an ultralytics Results object (tracked or not)."""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            self.write(frame_index, timestamp, None, [], [], np.empty((0, 4)))
+            return
+        track_ids = boxes.id.int().cpu().numpy() if boxes.id is not None else None
+        self.write(frame_index, timestamp, track_ids, boxes.cls.int().cpu().numpy(),
+                   boxes.conf.cpu().numpy(), boxes.xyxy.cpu().numpy())
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class DetectionLog:
+    """
+    Memory-mapped, read-only view of a detection log. Nothing is loaded up
+    front; the OS pages records in as they are touched.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+                raise ValueError(f"{path} is not a detection log")
+        size = os.path.getsize(path) - len(LOG_MAGIC)
+        count = size // DETECTION_DTYPE.itemsize
+        if count:
+            self.records = np.memmap(path, dtype=DETECTION_DTYPE, mode="r", offset=len(LOG_MAGIC), shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=DETECTION_DTYPE)
+
+        # Frame boundaries are the marker records
+        self.frame_starts = np.flatnonzero(self.records["class_id"] == FRAME_MARKER)
+
+    def __len__(self):
+        """Number of frames."""
+        return len(self.frame_starts)
+
+    @property
+    def detections(self):
+        """All detection records (markers excluded)."""
+        return self.records[self.records["class_id"] != FRAME_MARKER]
+
+    def frames(self):
+        """Yield (frame_index, timestamp, detections) per frame, in recording order."""
+        ends = np.append(self.frame_starts[1:], len(self.records))
+        for start, end in zip(self.frame_starts, ends):
+            marker = self.records[start]
+            yield int(marker["frame_index"]), float(marker["timestamp"]), self.records[start + 1:end]
+
+
+def xywh(detections):
+    """Centre/size boxes (N, 4) from detection records, as the scripts use them."""
+    x1, y1, x2, y2 = (detections[name].astype(np.float64) for name in ("x1", "y1", "x2", "y2"))
+    return np.stack([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], axis=1)
+
+
+def replay_vehicle_counts(log, vehicle_classes):
+    """
+    Vehicle count per frame for the whole log, computed in one vectorized pass.
+    Like the live count, only tracked detections are counted.
+    """
+    records = log.records
+    frame_number = np.cumsum(records["class_id"] == FRAME_MARKER) - 1
+    is_vehicle = np.isin(records["class_id"], vehicle_classes) & (records["track_id"] >= 0)
+    return np.bincount(frame_number[is_vehicle], minlength=len(log))
+
+
+def replay_recommendations(log, low_threshold, high_threshold, vehicle_classes):
+    """
+    Re-run the density thresholds over a log without touching the models.
+    Returns (timestamps, vehicle_counts, green_seconds) arrays, one entry per frame.
+    """
+    counts = replay_vehicle_counts(log, vehicle_classes)
+    green = np.select([counts <= low_threshold, counts <= high_threshold], [20, 45], default=60)
+    timestamps = np.asarray(log.records["timestamp"][log.frame_starts])
+    return timestamps, counts, green
+
+
+def replay_line_counter(log, line_counter, vehicle_classes):
+    """Feed a LineCounter from a log; returns its totals."""
+    for frame_index, _, detections in log.frames():
+        detections = detections[np.isin(detections["class_id"], vehicle_classes) & (detections["track_id"] >= 0)]
+        line_counter.update(frame_index, detections["track_id"], xywh(detections)[:, :2])
+    return line_counter.totals()
@@ -0,0 +1,83 @@
+import time
+
+# --- Configuration ---
+# Run the ambulance model on every Nth frame when nothing interesting is going on
+AMBULANCE_EVERY_N_FRAMES = 5
+# ...but never leave a stream unchecked for longer than this, whatever its FPS
+AMBULANCE_MAX_INTERVAL_SECONDS = 0.5
+# General-model classes that make an ambulance plausible: bus=5, truck=7
+AMBULANCE_TRIGGER_CLASSES = [5, 7]
+# A candidate is dropped after this many consecutive empty ambulance frames
+CANDIDATE_DISMISS_FRAMES = 5
+
+# ---------------------
+
+
+class AmbulanceScheduler:
+    """
+    Decides, per stream and per frame, whether the ambulance model has to run.
+
+    Idle: every Nth frame, and at least every max_interval_seconds.
+    Triggered: the next frame is checked as soon as the general model sees a
+    large vehicle (bus/truck) or something else calls trigger(), e.g. motion
+    in an approach zone.
+    Candidate: once the ambulance model has seen something it runs on every
+    frame until the vehicle has been gone for dismiss_frames frames, so the
+    priority override reacts as quickly as it did with per-frame detection.
+    """
+
+    def __init__(self, every_n_frames=AMBULANCE_EVERY_N_FRAMES, max_interval_seconds=AMBULANCE_MAX_INTERVAL_SECONDS,
+                 trigger_classes=AMBULANCE_TRIGGER_CLASSES, dismiss_frames=CANDIDATE_DISMISS_FRAMES):
+        self.every_n_frames = max(1, every_n_frames)
+        self.max_interval_seconds = max_interval_seconds
+        self.trigger_classes = set(trigger_classes)
+        self.dismiss_frames = dismiss_frames
+
+        self.last_run_frame = None
+        self.last_run_time = None
+        self.triggered = False
+        self.candidate = False
+        self.misses = 0
+        self.runs = 0
+        self.skips = 0
+
+    def should_run(self, frame_index, now=None):
+        now = time.time() if now is None else now
+        run = (
+            self.candidate
+            or self.triggered
+            or self.last_run_frame is None
+            or frame_index - self.last_run_frame >= self.every_n_frames
+            or now - self.last_run_time >= self.max_interval_seconds
+        )
+        if run:
+            self.last_run_frame = frame_index
+            self.last_run_time = now
+            self.triggered = False
+            self.runs += 1
+        else:
+            self.skips += 1
+        return run
+
+    def trigger(self):
+        """Force the ambulance model to run on the next frame."""
+        self.triggered = True
+
+    def observe_ambulance(self, ambulance_result):
+        """Feed the ambulance model's output for a frame it ran on."""
+        if len(ambulance_result.boxes) > 0:
+            self.candidate = True
+            self.misses = 0
+        elif self.candidate:
+            self.misses += 1
+            if self.misses >= self.dismiss_frames:
+                self.candidate = False
+                self.misses = 0
+
+    def observe_general(self, general_result):
+        """Feed the general model's output; large vehicles trigger a check."""
+        if general_result.boxes is None or len(general_result.boxes) == 0:
+            return
+        class_ids = general_result.boxes.cls.int().cpu().tolist()
+        if any(cid in self.trigger_classes for cid in class_ids):
+            self.trigger()
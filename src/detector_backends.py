@@ -0,0 +1,183 @@
+import argparse
+import os
+import shutil
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+# --- Configuration ---
+BACKENDS = ["torch", "onnx", "openvino"]
+IMAGE_SIZE = 640
+# Frames used to calibrate INT8 quantization
+CALIBRATION_FRAMES = 100
+
+# ---------------------
+
+
+def sample_frames(source, count=CALIBRATION_FRAMES):
+    """Evenly spaced frames from a video file, e.g. for INT8 calibration."""
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video file {source}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    frames = []
+    for index in np.linspace(0, max(total - 1, 0), num=min(count, total), dtype=int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame)
+    cap.release()
+    return frames
+
+
+def preprocess(frame, imgsz=IMAGE_SIZE):
+    """BGR frame -> (1, 3, imgsz, imgsz) float32 tensor, letterboxed like YOLO does."""
+    from ultralytics.data.augment import LetterBox
+
+    image = LetterBox((imgsz, imgsz), auto=False)(image=frame)
+    image = image[..., ::-1].transpose(2, 0, 1)  # BGR -> RGB, HWC -> CHW
+    return np.ascontiguousarray(image, dtype=np.float32)[None] / 255.0
+
+
+def _is_stale(exported, weights):
+    return not os.path.exists(exported) or os.path.getmtime(exported) < os.path.getmtime(weights)
+
+
+def export_model(weights, backend, int8=False, calibration_frames=None, imgsz=IMAGE_SIZE):
+    """
+    Export PyTorch weights once for an optimized CPU runtime and return the
+    path YOLO() can load. Existing exports newer than the weights are reused.
+
+    INT8 needs calibration_frames (a list of BGR frames from the target camera)
+    and is only available for the onnx and openvino backends.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    if int8 and backend == "torch":
+        raise ValueError("INT8 is only supported with the onnx and openvino backends")
+    if backend == "torch":
+        return weights
+    if int8 and not calibration_frames:
+        raise ValueError("INT8 export needs calibration frames")
+
+    stem = Path(weights).with_suffix("")
+    if backend == "onnx":
+        fp32_path = f"{stem}.onnx"
+        if _is_stale(fp32_path, weights):
+            # dynamic=True keeps the batch dimension free for batched inference
+            fp32_path = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True)
+        if not int8:
+            return fp32_path
+        int8_path = f"{stem}_int8.onnx"
+        if _is_stale(int8_path, weights):
+            _quantize_onnx(fp32_path, int8_path, calibration_frames, imgsz)
+        return int8_path
+
+    fp32_dir = f"{stem}_openvino_model"
+    if _is_stale(fp32_dir, weights):
+        fp32_dir = YOLO(weights).export(format="openvino", imgsz=imgsz, dynamic=True)
+    if not int8:
+        return fp32_dir
+    int8_dir = f"{stem}_int8_openvino_model"
+    if _is_stale(int8_dir, weights):
+        _quantize_openvino(fp32_dir, int8_dir, calibration_frames, imgsz)
+    return int8_dir
+
+
+def _quantize_onnx(fp32_path, int8_path, calibration_frames, imgsz):
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_static
+
+    input_name = onnx.load(fp32_path, load_external_data=False).graph.input[0].name
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.frames = iter(calibration_frames)
+
+        def get_next(self):
+            frame = next(self.frames, None)
+            return None if frame is None else {input_name: preprocess(frame, imgsz)}
+
+    quantize_static(fp32_path, int8_path, FrameReader(), weight_type=QuantType.QInt8)
+
+    # Keep the class names / stride metadata so YOLO() can load the quantized file
+    fp32_model = onnx.load(fp32_path)
+    int8_model = onnx.load(int8_path)
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, int8_path)
+
+
+def _quantize_openvino(fp32_dir, int8_dir, calibration_frames, imgsz):
+    import nncf
+    import openvino as ov
+
+    xml_path = next(Path(fp32_dir).glob("*.xml"))
+    model = ov.Core().read_model(xml_path)
+    dataset = nncf.Dataset(calibration_frames, lambda frame: preprocess(frame, imgsz))
+    quantized = nncf.quantize(model, dataset, preset=nncf.QuantizationPreset.MIXED)
+
+    os.makedirs(int8_dir, exist_ok=True)
+    ov.save_model(quantized, str(Path(int8_dir) / xml_path.name))
+    shutil.copy(Path(fp32_dir) / "metadata.yaml", Path(int8_dir) / "metadata.yaml")
+
+
+def load_detector(weights, backend="torch", int8=False, calibration_frames=None, imgsz=IMAGE_SIZE):
+    """
+    Load a detector on the chosen backend. The returned object is a YOLO model
+    either way, so it is called the same and returns the same Results
+    (boxes.xyxy / .cls / .conf) that the scripts already consume.
+    """
+    return load_exported(export_model(weights, backend, int8, calibration_frames, imgsz), backend)
+
+
+def load_exported(path, backend="torch"):
+    """Load a model export_model() already produced, without checking or exporting anything."""
+    if backend == "torch":
+        return YOLO(path)
+    return YOLO(path, task="detect")
+
+
+def compare_detectors(reference, candidate, frames, conf=0.5, classes=None):
+    """
+    Run two detectors on the same frames and compare their per-frame counts.
+    Returns {"frames", "mean_abs_count_diff", "exact_count_match"} so an
+    exported/quantized model can be checked against the PyTorch one.
+    """
+    diffs = []
+    for frame in frames:
+        counts = []
+        for model in (reference, candidate):
+            cls = model(frame, conf=conf, verbose=False)[0].boxes.cls.int().cpu().numpy()
+            if classes is not None:
+                cls = cls[np.isin(cls, classes)]
+            counts.append(len(cls))
+        diffs.append(abs(counts[0] - counts[1]))
+
+    diffs = np.array(diffs)
+    return {
+        "frames": len(frames),
+        "mean_abs_count_diff": float(diffs.mean()) if len(diffs) else 0.0,
+        "exact_count_match": float((diffs == 0).mean()) if len(diffs) else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a detector and compare it against the PyTorch model.")
+    parser.add_argument("--weights", default="yolov8n.pt")
+    parser.add_argument("--backend", choices=BACKENDS, default="onnx")
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--video", required=True, help="Video used for calibration and comparison.")
+    parser.add_argument("--frames", type=int, default=CALIBRATION_FRAMES)
+    args = parser.parse_args()
+
+    frames = sample_frames(args.video, args.frames)
+    reference = YOLO(args.weights)
+    candidate = load_detector(args.weights, args.backend, args.int8, frames)
+    print(compare_detectors(reference, candidate, frames))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import time
+from collections import deque
+
+import numpy as np
+
+# --- Configuration ---
+# A vehicle is confirmed once the ambulance model saw it in CONFIRM_HITS of
+# the last CONFIRM_WINDOW frames it ran on
+CONFIRM_HITS = 3
+CONFIRM_WINDOW = 5
+# The override is released after this many ambulance-model frames without it
+CLEAR_MISSES = 5
+# Detections in consecutive frames belong to the same vehicle above this overlap
+MATCH_IOU = 0.3
+# Safety cap on a single override, whatever the vehicle does
+MAX_OVERRIDE_SECONDS = 20
+# Centre positions kept per vehicle, and how many pixels it must close in on
+# the stop line over them to count as approaching
+HISTORY_LENGTH = 10
+APPROACH_MIN_PIXELS = 5.0
+
+IDLE = "idle"
+CANDIDATE = "candidate"
+OVERRIDE = "override"
+
+# ---------------------
+
+
+def box_iou(a, b):
+    """IoU matrix between (N, 4) and (M, 4) xyxy boxes."""
+    a, b = np.asarray(a, dtype=np.float64).reshape(-1, 4), np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+class EmergencyTrack:
+    def __init__(self, track_id, box, confirm_window):
+        self.id = track_id
+        self.box = box
+        self.hits = deque([1], maxlen=confirm_window)
+        self.misses = 0
+        self.centers = deque(maxlen=HISTORY_LENGTH)
+        self.centers.append(((box[0] + box[2]) / 2, (box[1] + box[3]) / 2))
+
+
+class EmergencyStateMachine:
+    """
+    Per-stream emergency vehicle state: idle -> candidate -> override -> idle.
+
+    Ambulance detections are linked across frames by box overlap, giving each
+    vehicle a persistent track ID. The override starts only when one track is
+    confirmed (CONFIRM_HITS of the last CONFIRM_WINDOW frames) and, if a stop
+    line is given, is moving toward it or standing still on its approach side
+    (e.g. stuck behind a queue). The approach side is the one forward
+    crossings come from, as for a CountingLine. It ends as soon as that vehicle has
+    crossed the stop line or has not been seen for CLEAR_MISSES frames, and
+    never lasts longer than max_override_seconds. A vehicle that has been
+    served does not trigger a second override.
+
+    update() is called only for frames the ambulance model ran on; tick()
+    applies the time cap on the frames in between.
+    """
+
+    def __init__(self, stop_line=None, zone_map=None, confirm_hits=CONFIRM_HITS, confirm_window=CONFIRM_WINDOW,
+                 clear_misses=CLEAR_MISSES, match_iou=MATCH_IOU, max_override_seconds=MAX_OVERRIDE_SECONDS):
+        self.stop_line = stop_line
+        self.zone_map = zone_map
+        self.confirm_hits = confirm_hits
+        self.confirm_window = confirm_window
+        self.clear_misses = clear_misses
+        self.match_iou = match_iou
+        self.max_override_seconds = max_override_seconds
+
+        self.state = IDLE
+        self.tracks = []
+        self.next_id = 1
+        self.served = set()
+        self.override_track = None
+        self.override_started = None
+        self.last_release = None
+
+    def _distance(self, center):
+        """Signed distance of a point from the stop line (negative on its approach side)."""
+        (x1, y1), (x2, y2) = self.stop_line.start, self.stop_line.end
+        length = max(np.hypot(x2 - x1, y2 - y1), 1e-9)
+        return ((x2 - x1) * (center[1] - y1) - (y2 - y1) * (center[0] - x1)) / length
+
+    def approaching(self, track):
+        """
+        Whether the vehicle is closing in on the stop line, or waiting on its
+        approach side without moving (always True without a stop line).
+        """
+        if self.stop_line is None:
+            return True
+        if len(track.centers) < 2:
+            return False
+        first, last = self._distance(track.centers[0]), self._distance(track.centers[-1])
+        if abs(last - first) < APPROACH_MIN_PIXELS:
+            return last < 0
+        return np.sign(first) == np.sign(last) and abs(first) - abs(last) >= APPROACH_MIN_PIXELS
+
+    def passed(self, track):
+        """Whether the vehicle has crossed the stop line since it was first seen."""
+        if self.stop_line is None or len(track.centers) < 2:
+            return False
+        return np.sign(self._distance(track.centers[0])) != np.sign(self._distance(track.centers[-1]))
+
+    def lane(self, track):
+        if self.zone_map is None:
+            return None
+        lane = self.zone_map.assign([track.centers[-1]])[0]
+        return self.zone_map.names[lane] if lane >= 0 else None
+
+    def _associate(self, boxes):
+        """Greedy IoU matching of this frame's boxes to the known tracks."""
+        matched_tracks, matched_boxes = set(), set()
+        if self.tracks and len(boxes):
+            iou = box_iou([t.box for t in self.tracks], boxes)
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                t, b = np.unravel_index(flat, iou.shape)
+                if iou[t, b] < self.match_iou:
+                    break
+                if t in matched_tracks or b in matched_boxes:
+                    continue
+                matched_tracks.add(t)
+                matched_boxes.add(b)
+                track = self.tracks[t]
+                track.box = boxes[b]
+                track.hits.append(1)
+                track.misses = 0
+                track.centers.append(((boxes[b][0] + boxes[b][2]) / 2, (boxes[b][1] + boxes[b][3]) / 2))
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.hits.append(0)
+                track.misses += 1
+        for b in range(len(boxes)):
+            if b not in matched_boxes:
+                self.tracks.append(EmergencyTrack(self.next_id, boxes[b], self.confirm_window))
+                self.next_id += 1
+
+    def update(self, boxes_xyxy, now=None):
+        """Feed the ambulance model's boxes for one frame. Returns the new state."""
+        now = time.time() if now is None else now
+        self._associate(np.asarray(boxes_xyxy, dtype=np.float64).reshape(-1, 4))
+
+        if self.state == OVERRIDE:
+            track = self.override_track
+            if track.misses >= self.clear_misses or self.passed(track):
+                self._release(now)
+        self.tracks = [t for t in self.tracks if t.misses < self.clear_misses]
+        self.served &= {t.id for t in self.tracks}
+
+        if self.state != OVERRIDE:
+            for track in self.tracks:
+                if (track.id not in self.served and sum(track.hits) >= self.confirm_hits
+                        and self.approaching(track)):
+                    self.state = OVERRIDE
+                    self.override_track = track
+                    self.override_started = now
+                    break
+            else:
+                waiting = any(t.id not in self.served for t in self.tracks)
+                self.state = CANDIDATE if waiting else IDLE
+        return self.tick(now)
+
+    def tick(self, now=None):
+        """Apply the override time cap. Returns the current state."""
+        now = time.time() if now is None else now
+        if self.state == OVERRIDE and now - self.override_started >= self.max_override_seconds:
+            self._release(now)
+        return self.state
+
+    def _release(self, now):
+        self.served.add(self.override_track.id)
+        self.override_track = None
+        self.override_started = None
+        self.last_release = now
+        self.state = IDLE
+
+    def remaining(self, now=None):
+        """Seconds left until the override time cap, or None outside an override."""
+        if self.state != OVERRIDE:
+            return None
+        now = time.time() if now is None else now
+        return max(0.0, self.max_override_seconds - (now - self.override_started))
+
+    def info(self):
+        """State summary for the decision output."""
+        track = self.override_track
+        if track is None:
+            return {"state": self.state}
+        return {"state": self.state, "track_id": track.id, "lane": self.lane(track),
+                "approaching": bool(self.approaching(track))}
@@ -0,0 +1,3 @@
+def safe_filename(name):
+    """Stream names are often URLs; keep only characters safe in a file name."""
+    return "".join(c if c.isalnum() else "_" for c in name)
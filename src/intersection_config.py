@@ -0,0 +1,320 @@
+import argparse
+import json
+import os
+import sys
+import threading
+
+from detection_scheduler import AMBULANCE_TRIGGER_CLASSES
+from detector_backends import BACKENDS
+from line_counter import CountingLine
+from queue_zones import parse_zones
+from recommendation import HIGH_THRESHOLD, LOW_THRESHOLD
+from stream_processor import AMBULANCE_PRIORITY_SECONDS, VEHICLE_CLASSES
+
+# --- Configuration ---
+# How often the running service checks the config file for changes
+RELOAD_POLL_SECONDS = 2.0
+DEFAULT_GENERAL_MODEL = "yolov8n.pt"
+DEFAULT_AMBULANCE_MODEL = "best.pt"
+DEFAULT_CONFIDENCE = 0.5
+
+# ---------------------
+
+# Camera fields that are only read when the stream is opened
+_CAPTURE_FIELDS = ["source", "roi", "max_size"]
+
+
+def _number(value, where, errors, minimum=None, integer=False):
+    kinds = (int,) if integer else (int, float)
+    if isinstance(value, bool) or not isinstance(value, kinds):
+        errors.append(f"{where}: expected {'an integer' if integer else 'a number'}, got {value!r}")
+        return value
+    if minimum is not None and value < minimum:
+        errors.append(f"{where}: must be at least {minimum}")
+    return value
+
+
+def _point(value, where, errors):
+    if not (isinstance(value, list) and len(value) == 2
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)):
+        errors.append(f"{where}: expected [x, y], got {value!r}")
+        return None
+    return tuple(value)
+
+
+def _classes(value, where, errors):
+    if not (isinstance(value, list) and value
+            and all(isinstance(c, int) and not isinstance(c, bool) and c >= 0 for c in value)):
+        errors.append(f"{where}: expected a non-empty list of class IDs, got {value!r}")
+        return None
+    return list(value)
+
+
+def _thresholds(section, defaults, where, errors):
+    thresholds = dict(defaults)
+    for key, value in section.items():
+        if key not in defaults:
+            errors.append(f"{where}.{key}: unknown threshold")
+            continue
+        thresholds[key] = _number(value, f"{where}.{key}", errors, minimum=0)
+    low, high = thresholds["low"], thresholds["high"]
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (low, high)) and low >= high:
+        errors.append(f"{where}: low ({thresholds['low']}) must be below high ({thresholds['high']})")
+    return thresholds
+
+
+def _camera(entry, index, defaults, errors):
+    where = f"cameras[{index}]"
+    if not isinstance(entry, dict):
+        errors.append(f"{where}: expected an object")
+        return None
+    unknown = set(entry) - {"name", "source", "roi", "max_size", "lines", "zones", "vehicle_classes",
+                            "trigger_classes", "thresholds"}
+    errors.extend(f"{where}.{key}: unknown field" for key in sorted(unknown))
+    if "source" not in entry:
+        errors.append(f"{where}.source: missing")
+
+    camera = {
+        "name": str(entry.get("name", entry.get("source"))),
+        "source": entry.get("source"),
+        "roi": None,
+        "max_size": None,
+        "lines": [],
+        "zones": [],
+        "vehicle_classes": defaults["vehicle_classes"],
+        "trigger_classes": defaults["trigger_classes"],
+    }
+    if entry.get("roi") is not None:
+        roi = entry["roi"]
+        if not (isinstance(roi, list) and len(roi) == 4 and all(isinstance(v, int) for v in roi)
+                and roi[2] > 0 and roi[3] > 0):
+            errors.append(f"{where}.roi: expected [x, y, w, h] in pixels, got {roi!r}")
+        else:
+            camera["roi"] = tuple(roi)
+    if entry.get("max_size") is not None:
+        camera["max_size"] = _number(entry["max_size"], f"{where}.max_size", errors, minimum=1, integer=True)
+
+    for i, line in enumerate(entry.get("lines", [])):
+        line_where = f"{where}.lines[{i}]"
+        if not isinstance(line, dict) or "start" not in line or "end" not in line:
+            errors.append(f"{line_where}: expected {{\"name\", \"start\", \"end\"}}")
+            continue
+        start = _point(line["start"], f"{line_where}.start", errors)
+        end = _point(line["end"], f"{line_where}.end", errors)
+        if start is not None and end is not None:
+            if start == end:
+                errors.append(f"{line_where}: start and end are the same point")
+            camera["lines"].append(CountingLine(str(line.get("name", f"line_{i}")), start, end))
+
+    try:
+        camera["zones"] = parse_zones(entry.get("zones", []))
+    except (KeyError, TypeError, ValueError) as e:
+        errors.append(f"{where}.zones: {e}")
+    names = [name for name, _ in camera["zones"]]
+    if len(set(names)) != len(names):
+        errors.append(f"{where}.zones: zone names must be unique")
+
+    for key in ("vehicle_classes", "trigger_classes"):
+        if key in entry:
+            camera[key] = _classes(entry[key], f"{where}.{key}", errors)
+    thresholds = _thresholds(entry.get("thresholds", {}), defaults["thresholds"], f"{where}.thresholds", errors)
+    camera["low_threshold"] = thresholds["low"]
+    camera["high_threshold"] = thresholds["high"]
+    camera["priority_seconds"] = thresholds["priority_seconds"]
+    return camera
+
+
+def parse_config(data):
+    """
+    Validate a deployment config (already parsed from JSON) and fill in the
+    defaults. Raises ValueError listing every problem found.
+
+        {"intersection": "main_and_5th",
+         "models": {"general": "yolov8n.pt", "ambulance": "best.pt", "backend": "torch"},
+         "confidence": 0.5, "vehicle_classes": [2, 3, 5, 7],
+         "thresholds": {"low": 5, "high": 10, "priority_seconds": 20},
+         "cameras": [{"name": "north", "source": "rtsp://...", "roi": [x, y, w, h], "max_size": 1280,
+                      "lines": [{"name": "stop_line", "start": [x, y], "end": [x, y]}],
+                      "zones": [{"name": "north_left", "polygon": [[x, y], ...]}],
+                      "thresholds": {"high": 12}}],
+         "phases": [{"name": "north_south", "approaches": ["north", "south"]}]}
+
+    Class sets and thresholds given on a camera override the top-level ones.
+    """
+    errors = []
+    if not isinstance(data, dict):
+        raise ValueError("config: expected an object")
+    unknown = set(data) - {"intersection", "models", "confidence", "vehicle_classes", "trigger_classes",
+                           "thresholds", "phases", "cameras"}
+    errors.extend(f"{key}: unknown field" for key in sorted(unknown))
+
+    models = {"general": DEFAULT_GENERAL_MODEL, "ambulance": DEFAULT_AMBULANCE_MODEL, "backend": "torch",
+              "int8": False, "calibration_video": None}
+    for key, value in data.get("models", {}).items():
+        if key not in models:
+            errors.append(f"models.{key}: unknown field")
+        models[key] = value
+    if models["backend"] not in BACKENDS:
+        errors.append(f"models.backend: must be one of {', '.join(BACKENDS)}")
+    if models["int8"] and models["backend"] == "torch":
+        errors.append("models.int8: needs backend onnx or openvino")
+    if models["int8"] and not models["calibration_video"]:
+        errors.append("models.int8: needs models.calibration_video")
+
+    confidence = _number(data.get("confidence", DEFAULT_CONFIDENCE), "confidence", errors)
+    if isinstance(confidence, (int, float)) and not 0 < confidence < 1:
+        errors.append("confidence: must be between 0 and 1")
+
+    defaults = {
+        "vehicle_classes": _classes(data.get("vehicle_classes", VEHICLE_CLASSES), "vehicle_classes", errors),
+        "trigger_classes": _classes(data.get("trigger_classes", AMBULANCE_TRIGGER_CLASSES), "trigger_classes",
+                                    errors),
+        "thresholds": _thresholds(data.get("thresholds", {}), {"low": LOW_THRESHOLD, "high": HIGH_THRESHOLD,
+                                  "priority_seconds": AMBULANCE_PRIORITY_SECONDS}, "thresholds", errors),
+    }
+
+    cameras = [_camera(entry, i, defaults, errors) for i, entry in enumerate(data.get("cameras", []))]
+    cameras = [camera for camera in cameras if camera is not None]
+    if not cameras:
+        errors.append("cameras: at least one camera is needed")
+    names = [camera["name"] for camera in cameras]
+    for name in sorted({name for name in names if names.count(name) > 1}):
+        errors.append(f"cameras: name {name!r} is used more than once")
+
+    # Phases group approaches, and every approach is a camera
+    phases = None
+    if data.get("phases") is not None:
+        phases = []
+        for i, phase in enumerate(data["phases"]):
+            if not isinstance(phase, dict) or "name" not in phase or not phase.get("approaches"):
+                errors.append(f"phases[{i}]: expected {{\"name\", \"approaches\": [camera names]}}")
+                continue
+            for approach in phase["approaches"]:
+                if approach not in names:
+                    errors.append(f"phases[{i}].approaches: {approach!r} is not a camera name")
+            phases.append((phase["name"], list(phase["approaches"])))
+
+    if errors:
+        raise ValueError("Invalid config:\n  " + "\n  ".join(errors))
+    return {
+        "intersection": str(data.get("intersection", "default")),
+        "models": models,
+        "confidence": confidence,
+        "phases": phases,
+        "cameras": cameras,
+    }
+
+
+def load_config(path):
+    """Read and validate a deployment config file (see parse_config)."""
+    with open(path) as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid config: {path} is not valid JSON ({e})")
+    return parse_config(data)
+
+
+def stream_source(camera):
+    """The MultiStreamRunner source entry of a camera."""
+    return {"source": camera["source"], "name": camera["name"], "roi": camera["roi"], "max_size": camera["max_size"]}
+
+
+def stream_settings(camera):
+    """The MultiStreamRunner.update_stream_settings() arguments of a camera."""
+    return {
+        "counting_lines": camera["lines"],
+        "queue_zones": camera["zones"],
+        "low_threshold": camera["low_threshold"],
+        "high_threshold": camera["high_threshold"],
+        "vehicle_classes": camera["vehicle_classes"],
+        "trigger_classes": camera["trigger_classes"],
+        "priority_seconds": camera["priority_seconds"],
+    }
+
+
+def restart_required(old, new):
+    """Changes between two configs that only take effect after a restart."""
+    changes = []
+    if old["models"] != new["models"]:
+        changes.append("models")
+    if old["intersection"] != new["intersection"]:
+        changes.append("intersection")
+    old_cameras = {camera["name"]: camera for camera in old["cameras"]}
+    new_cameras = {camera["name"]: camera for camera in new["cameras"]}
+    for name in sorted(set(old_cameras) ^ set(new_cameras)):
+        changes.append(f"camera {name!r} added or removed")
+    for name in sorted(set(old_cameras) & set(new_cameras)):
+        for field in _CAPTURE_FIELDS:
+            if old_cameras[name][field] != new_cameras[name][field]:
+                changes.append(f"cameras[{name!r}].{field}")
+    return changes
+
+
+class ConfigWatcher:
+    """
+    Re-reads a config file whenever it changes on disk.
+
+    A background thread compares the file's modification time every
+    poll_seconds. A changed file is validated first; if it is invalid the
+    errors are printed and the running config stays in force, so a typo
+    made while tuning in the field never takes the service down.
+    on_reload(new_config, old_config) is called for every valid change.
+    """
+
+    def __init__(self, path, on_reload, poll_seconds=RELOAD_POLL_SECONDS):
+        self.path = path
+        self.on_reload = on_reload
+        self.poll_seconds = poll_seconds
+        self.config = load_config(path)
+        self.mtime = os.stat(path).st_mtime_ns
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def check(self):
+        """Reload if the file changed. Returns True if a new config was applied."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        try:
+            config = load_config(self.path)
+        except (OSError, ValueError) as e:
+            print(f"Config not reloaded: {e}", file=sys.stderr)
+            return False
+        old, self.config = self.config, config
+        self.on_reload(config, old)
+        return True
+
+    def _run(self):
+        while not self.stopped.wait(self.poll_seconds):
+            self.check()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate an intersection config file.")
+    parser.add_argument("config")
+    args = parser.parse_args()
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(e)
+        exit(1)
+    print(f"{args.config}: intersection {config['intersection']!r}, {len(config['cameras'])} camera(s)")
+    for camera in config["cameras"]:
+        print(f"  {camera['name']}: {len(camera['lines'])} line(s), {len(camera['zones'])} zone(s), "
+              f"thresholds {camera['low_threshold']}/{camera['high_threshold']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import cv2
+import numpy as np
+import torch
+
+# --- Configuration ---
+# Run the detector on every Nth frame; frames in between get propagated boxes
+KEYFRAME_INTERVAL = 3
+# "flow": sparse Lucas-Kanade optical flow on points inside each box
+# "velocity": constant-velocity prediction from the last keyframes only
+PROPAGATION_METHOD = "flow"
+# Optical flow runs on a grayscale copy scaled to this width
+FLOW_WIDTH = 480
+# A box needs this many successfully tracked points, else it falls back to its velocity
+MIN_FLOW_POINTS = 3
+# Weight of the newest flow measurement in a track's velocity estimate
+VELOCITY_SMOOTHING = 0.5
+
+# ---------------------
+
+# 3x3 grid of sample points inside each box, as fractions of its width/height
+_GRID = np.array([(fx, fy) for fy in (0.25, 0.5, 0.75) for fx in (0.25, 0.5, 0.75)], dtype=np.float32)
+_LK_PARAMS = dict(winSize=(15, 15), maxLevel=2,
+                  criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+
+class TrackPropagator:
+    """
+    Moves the tracks of the last keyframe along between detector runs.
+
+    reset() takes the tracked result of a keyframe; propagate() returns a
+    Results object for a later frame, with the same track IDs, classes and
+    confidences but boxes shifted by the estimated motion. The result can be
+    passed to StreamProcessor.update_traffic like a real detection, so
+    counts, queue zones and counting lines keep updating on every frame.
+
+    With "flow" each box follows the median optical flow of a 3x3 grid of
+    points inside it, frame to frame; boxes whose points are lost fall back
+    to a constant-velocity prediction, which is all "velocity" uses.
+    """
+
+    def __init__(self, frame_width, frame_height, method=PROPAGATION_METHOD, flow_width=FLOW_WIDTH):
+        if method not in ("flow", "velocity"):
+            raise ValueError(f"Unknown propagation method {method!r}")
+        self.method = method
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.scale = min(1.0, flow_width / frame_width)
+        self.flow_size = (max(1, int(round(frame_width * self.scale))), max(1, int(round(frame_height * self.scale))))
+
+        self.template = None
+        self.keyframe_index = None
+        self.frame_index = None
+        self.ids = np.empty(0, dtype=np.int64)
+        self.xyxy = np.empty((0, 4), dtype=np.float32)
+        self.conf = np.empty(0, dtype=np.float32)
+        self.cls = np.empty(0, dtype=np.float32)
+        self.velocity = np.empty((0, 2), dtype=np.float32)
+        self.key_ids = self.ids
+        self.key_xyxy = self.xyxy
+        self.gray = None
+
+    def _gray(self, frame):
+        small = cv2.resize(frame, self.flow_size, interpolation=cv2.INTER_AREA) if self.scale < 1.0 else frame
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def reset(self, tracked_result, frame, frame_index):
+        """Start from a keyframe's tracked detections."""
+        boxes = tracked_result.boxes
+        if boxes is not None and boxes.id is not None and len(boxes):
+            ids = boxes.id.int().cpu().numpy().astype(np.int64)
+            xyxy = boxes.xyxy.cpu().numpy().astype(np.float32)
+            conf = boxes.conf.cpu().numpy().astype(np.float32)
+            cls = boxes.cls.cpu().numpy().astype(np.float32)
+        else:
+            ids = np.empty(0, dtype=np.int64)
+            xyxy = np.empty((0, 4), dtype=np.float32)
+            conf = cls = np.empty(0, dtype=np.float32)
+
+        # Velocity per track from its movement since the previous keyframe
+        velocity = np.zeros((len(ids), 2), dtype=np.float32)
+        if self.keyframe_index is not None and len(ids) and len(self.key_ids):
+            gap = max(1, frame_index - self.keyframe_index)
+            order = np.argsort(self.key_ids)
+            pos = np.clip(np.searchsorted(self.key_ids, ids, sorter=order), 0, len(self.key_ids) - 1)
+            previous = order[pos]
+            known = self.key_ids[previous] == ids
+            centers = (xyxy[:, :2] + xyxy[:, 2:]) / 2
+            old_centers = (self.key_xyxy[previous, :2] + self.key_xyxy[previous, 2:]) / 2
+            measured = (centers - old_centers) / gap
+            velocity[known] = measured[known]
+
+        self.template = tracked_result
+        self.keyframe_index = self.frame_index = frame_index
+        self.ids, self.xyxy, self.conf, self.cls, self.velocity = ids, xyxy, conf, cls, velocity
+        self.key_ids, self.key_xyxy = ids, xyxy.copy()
+        self.gray = self._gray(frame) if self.method == "flow" else None
+
+    def propagate(self, frame, frame_index):
+        """Tracked Results for a frame after the keyframe, with propagated boxes."""
+        steps = max(1, frame_index - self.frame_index)
+        shift = self.velocity * steps
+
+        if self.method == "flow" and len(self.ids):
+            gray = self._gray(frame)
+            sizes = self.xyxy[:, 2:] - self.xyxy[:, :2]
+            points = (self.xyxy[:, None, :2] + _GRID[None] * sizes[:, None]) * self.scale
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(self.gray, gray, points.reshape(-1, 1, 2), None, **_LK_PARAMS)
+            delta = (moved.reshape(len(self.ids), len(_GRID), 2) - points) / self.scale
+            ok = status.reshape(len(self.ids), len(_GRID)).astype(bool)
+            delta[~ok] = np.nan
+            has_flow = ok.sum(axis=1) >= MIN_FLOW_POINTS
+            if has_flow.any():
+                measured = np.nanmedian(delta[has_flow], axis=1)
+                shift[has_flow] = measured
+                self.velocity[has_flow] = (VELOCITY_SMOOTHING * measured / steps
+                                           + (1 - VELOCITY_SMOOTHING) * self.velocity[has_flow])
+            self.gray = gray
+
+        self.xyxy = self.xyxy + np.tile(shift, 2)
+        self.xyxy[:, [0, 2]] = np.clip(self.xyxy[:, [0, 2]], 0, self.frame_width)
+        self.xyxy[:, [1, 3]] = np.clip(self.xyxy[:, [1, 3]], 0, self.frame_height)
+        self.frame_index = frame_index
+        return self._result()
+
+    def _result(self):
+        result = self.template.new()
+        if len(self.ids):
+            data = np.column_stack([self.xyxy, self.ids, self.conf, self.cls]).astype(np.float32)
+            result.update(boxes=torch.as_tensor(data))
+        return result
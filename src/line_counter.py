@@ -0,0 +1,142 @@
+from collections import namedtuple
+
+import numpy as np
+
+# --- Configuration ---
+# Tracks not seen for this many frames are forgotten
+MAX_MISSING_FRAMES = 60
+
+# ---------------------
+
+# A counting line from start=(x, y) to end=(x, y). Seen from start to end,
+# "forward" crossings go from the left-hand side to the right-hand side in
+# image coordinates (a horizontal line drawn left-to-right counts downward
+# movement as forward, like the original count_vehicles.py).
+CountingLine = namedtuple("CountingLine", ["name", "start", "end"])
+
+FORWARD = 0
+BACKWARD = 1
+
+
+class LineCounter:
+    """
+    Streaming line-crossing counter for one camera.
+
+    Track state is kept as a few NumPy arrays (IDs, last centre, last frame
+    seen, already-counted flags), and each update checks every track against
+    every line with array operations. Tracks that disappear are evicted after
+    max_missing_frames, so memory stays flat however long the feed runs.
+    """
+
+    def __init__(self, lines, max_missing_frames=MAX_MISSING_FRAMES):
+        self.lines = list(lines)
+        self.max_missing_frames = max_missing_frames
+
+        self.starts = np.array([line.start for line in self.lines], dtype=np.float64).reshape(-1, 2)
+        self.directions = np.array([line.end for line in self.lines], dtype=np.float64).reshape(-1, 2) - self.starts
+        self.lengths_sq = np.maximum((self.directions ** 2).sum(axis=1), 1e-9)
+
+        # counts[line, FORWARD/BACKWARD]
+        self.counts = np.zeros((len(self.lines), 2), dtype=np.int64)
+
+        self.ids = np.empty(0, dtype=np.int64)
+        self.positions = np.empty((0, 2), dtype=np.float64)
+        self.last_seen = np.empty(0, dtype=np.int64)
+        self.counted = np.zeros((0, len(self.lines), 2), dtype=bool)
+
+    def _side(self, points):
+        """Signed side of each point relative to each line, shape (points, lines)."""
+        rel = points[:, None, :] - self.starts[None, :, :]
+        return self.directions[None, :, 0] * rel[..., 1] - self.directions[None, :, 1] * rel[..., 0]
+
+    def update(self, frame_index, track_ids, centers):
+        """
+        Feed the tracked centres of one frame.
+        Returns the new crossings as a list of (track_id, line_name, direction).
+        """
+        track_ids = np.asarray(track_ids, dtype=np.int64).reshape(-1)
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        events = []
+
+        # Match this frame's IDs against the known tracks
+        known = np.zeros(len(track_ids), dtype=bool)
+        slots = np.empty(0, dtype=np.int64)
+        if len(self.ids) and len(track_ids):
+            order = np.argsort(self.ids)
+            sorted_ids = self.ids[order]
+            pos = np.minimum(np.searchsorted(sorted_ids, track_ids), len(sorted_ids) - 1)
+            known = sorted_ids[pos] == track_ids
+            slots = order[pos[known]]
+
+        if len(slots) and len(self.lines):
+            prev = self.positions[slots]
+            cur = centers[known]
+            side_prev = self._side(prev)
+            side_cur = self._side(cur)
+
+            forward = (side_prev < 0) & (side_cur >= 0)
+            backward = (side_prev > 0) & (side_cur <= 0)
+            crossed = forward | backward
+
+            # Only count if the movement crosses the segment itself, not its extension
+            denom = np.where(crossed, side_prev - side_cur, 1.0)
+            s = np.where(crossed, side_prev / denom, 0.0)
+            hit = prev[:, None, :] + s[..., None] * (cur - prev)[:, None, :]
+            t = ((hit - self.starts[None]) * self.directions[None]).sum(axis=2) / self.lengths_sq[None]
+            on_segment = (t >= 0) & (t <= 1)
+
+            new = np.stack([forward & on_segment, backward & on_segment], axis=2) & ~self.counted[slots]
+            self.counts += new.sum(axis=0)
+            self.counted[slots] |= new
+
+            for k, line_index, direction in zip(*np.nonzero(new)):
+                events.append((int(self.ids[slots[k]]), self.lines[line_index].name, int(direction)))
+
+        # Update known tracks, append new ones
+        self.positions[slots] = centers[known]
+        self.last_seen[slots] = frame_index
+        new_ids = track_ids[~known]
+        if len(new_ids):
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.positions = np.concatenate([self.positions, centers[~known]])
+            self.last_seen = np.concatenate([self.last_seen, np.full(len(new_ids), frame_index, dtype=np.int64)])
+            self.counted = np.concatenate([self.counted, np.zeros((len(new_ids), len(self.lines), 2), dtype=bool)])
+
+        self._evict(frame_index)
+        return events
+
+    def _evict(self, frame_index):
+        keep = frame_index - self.last_seen <= self.max_missing_frames
+        if keep.all():
+            return
+        self.ids = self.ids[keep]
+        self.positions = self.positions[keep]
+        self.last_seen = self.last_seen[keep]
+        self.counted = self.counted[keep]
+
+    def carry_over(self, previous):
+        """
+        Take over the totals and already-counted flags of every line that
+        previous (the counter this one replaces) has too, so editing one line
+        does not reset the others or count their vehicles twice.
+        """
+        self.ids = previous.ids.copy()
+        self.positions = previous.positions.copy()
+        self.last_seen = previous.last_seen.copy()
+        self.counted = np.zeros((len(self.ids), len(self.lines), 2), dtype=bool)
+        for i, line in enumerate(self.lines):
+            if line in previous.lines:
+                j = previous.lines.index(line)
+                self.counts[i] = previous.counts[j]
+                self.counted[:, i] = previous.counted[:, j]
+
+    def totals(self):
+        """{line_name: {"forward": n, "backward": n}}"""
+        return {
+            line.name: {"forward": int(self.counts[i, FORWARD]), "backward": int(self.counts[i, BACKWARD])}
+            for i, line in enumerate(self.lines)
+        }
+
+    @property
+    def active_tracks(self):
+        return len(self.ids)
@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# --- Configuration ---
+# Percentiles are computed over the most recent samples of each stage
+WINDOW_SIZE = 1000
+PERCENTILES = [50, 90, 99]
+METRICS_PREFIX = "traffic"
+JSON_DUMP_SECONDS = 10.0
+
+# ---------------------
+
+
+class RollingWindow:
+    """The last `size` samples of one timer in a fixed array, plus lifetime count and sum."""
+
+    def __init__(self, size=WINDOW_SIZE):
+        self.samples = np.zeros(size, dtype=np.float64)
+        self.position = 0
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self.samples[self.position] = value
+        self.position = (self.position + 1) % len(self.samples)
+        self.count += 1
+        self.total += value
+
+    def values(self):
+        """The samples currently in the window (unordered)."""
+        return self.samples[:min(self.count, len(self.samples))].copy()
+
+    def percentiles(self, percentiles=PERCENTILES):
+        filled = self.values()
+        if len(filled) == 0:
+            return [None] * len(percentiles)
+        return [float(v) for v in np.percentile(filled, percentiles)]
+
+
+class PipelineMetrics:
+    """
+    Per-stream stage timers, counters and gauges for the running pipeline.
+
+    Timers keep a rolling window of durations in seconds (capture, preprocess,
+    ambulance_inference, general_inference, tracking, decision, output,
+    render, ...) and report percentiles over it. Gauges are callables that
+    are read at export time, e.g. a stream's dropped-frame counter. Safe to
+    update from the capture, inference and render threads at once.
+    """
+
+    def __init__(self, window_size=WINDOW_SIZE, percentiles=PERCENTILES):
+        self.window_size = window_size
+        self.percentile_list = percentiles
+        self.timers = {}
+        self.counters = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def observe(self, stream, stage, seconds):
+        with self.lock:
+            window = self.timers.get((stream, stage))
+            if window is None:
+                window = self.timers[(stream, stage)] = RollingWindow(self.window_size)
+            window.add(seconds)
+
+    @contextmanager
+    def timer(self, stream, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stream, stage, time.perf_counter() - start)
+
+    def values(self, stream, stage):
+        """Raw samples of one timer's window; empty if it never ran."""
+        with self.lock:
+            window = self.timers.get((stream, stage))
+            return window.values() if window is not None else np.empty(0)
+
+    def counter(self, stream, name):
+        with self.lock:
+            return self.counters.get((stream, name), 0)
+
+    def increment(self, stream, name, amount=1):
+        with self.lock:
+            self.counters[(stream, name)] = self.counters.get((stream, name), 0) + amount
+
+    def gauge(self, stream, name, read):
+        """Register a callable returning the current value of a gauge."""
+        with self.lock:
+            self.gauges[(stream, name)] = read
+
+    def snapshot(self):
+        """All metrics as a JSON-friendly dict, grouped by stream."""
+        with self.lock:
+            timers = {key: (window.percentiles(self.percentile_list), window.count, window.total)
+                      for key, window in self.timers.items()}
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+
+        streams = {}
+        for (stream, stage), (values, count, total) in timers.items():
+            entry = {f"p{p}": v for p, v in zip(self.percentile_list, values)}
+            entry.update(count=count, sum=total, mean=total / count if count else None)
+            streams.setdefault(stream, {}).setdefault("stages", {})[stage] = entry
+        for (stream, name), value in counters.items():
+            streams.setdefault(stream, {}).setdefault("counters", {})[name] = value
+        for (stream, name), read in gauges.items():
+            streams.setdefault(stream, {}).setdefault("gauges", {})[name] = read()
+        return {"timestamp": time.time(), "uptime": time.time() - self.started, "streams": streams}
+
+    def prometheus_text(self, prefix=METRICS_PREFIX):
+        """Prometheus text exposition format: one summary per stage, counters and gauges."""
+        snapshot = self.snapshot()
+        stage_lines, counter_lines, gauge_lines = [], [], []
+        for stream, data in sorted(snapshot["streams"].items()):
+            for stage, entry in sorted(data.get("stages", {}).items()):
+                labels = f'stream="{_escape(stream)}",stage="{_escape(stage)}"'
+                for p in self.percentile_list:
+                    if entry[f"p{p}"] is not None:
+                        stage_lines.append(f'{prefix}_stage_seconds{{{labels},quantile="{p / 100:g}"}} {entry[f"p{p}"]:.6f}')
+                stage_lines.append(f"{prefix}_stage_seconds_count{{{labels}}} {entry['count']}")
+                stage_lines.append(f"{prefix}_stage_seconds_sum{{{labels}}} {entry['sum']:.6f}")
+            for name, value in sorted(data.get("counters", {}).items()):
+                counter_lines.append(f'{prefix}_{name}_total{{stream="{_escape(stream)}"}} {value}')
+            for name, value in sorted(data.get("gauges", {}).items()):
+                gauge_lines.append(f'{prefix}_{name}{{stream="{_escape(stream)}"}} {value}')
+
+        lines = [f"# TYPE {prefix}_stage_seconds summary"] + stage_lines
+        for name in sorted({line.split("{")[0] for line in counter_lines}):
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(line for line in counter_lines if line.startswith(name + "{"))
+        for name in sorted({line.split("{")[0] for line in gauge_lines}):
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(line for line in gauge_lines if line.startswith(name + "{"))
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="0.0.0.0"):
+        """
+        Serve /metrics (Prometheus text) and /metrics.json on a background
+        thread. Returns the server; call shutdown() on it to stop.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.prometheus_text().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+    def dump_periodically(self, path, interval=JSON_DUMP_SECONDS, stop_event=None):
+        """Rewrite a JSON snapshot to `path` every `interval` seconds on a background thread."""
+        stop_event = stop_event or threading.Event()
+
+        def run():
+            while not stop_event.wait(interval):
+                self.dump(path)
+
+        threading.Thread(target=run, name="metrics-dump", daemon=True).start()
+        return stop_event
+
+    def dump(self, path):
+        # Write then rename, so readers never see a half-written file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from detector_backends import IMAGE_SIZE, load_detector
+
+# --- Configuration ---
+# Warm-up inferences per batch size before a model is handed frames; the
+# first calls pay for lazy initialisation, kernel selection and allocation
+WARMUP_RUNS = 2
+WARMUP_FRAME_SHAPE = (720, 1280, 3)
+
+# ---------------------
+
+
+class ModelRegistry:
+    """
+    Loads each model once per process, on first use, and shares it between
+    all streams. Models are registered by name, so callers only need to
+    agree on the name ("general", "ambulance"), not on who loads it.
+
+    warm_up() runs a few dummy inferences at the batch sizes the pipeline
+    will use. timings records the load and warm-up seconds per model, so a
+    restarted node can report how long it took until it could make decisions.
+    """
+
+    def __init__(self):
+        self.specs = {}
+        self.models = {}
+        self.timings = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def register(self, name, weights, backend="torch", int8=False, calibration_frames=None, imgsz=IMAGE_SIZE):
+        """Declare a model; nothing is loaded until get() is first called for it."""
+        with self.lock:
+            spec = (weights, backend, int8, imgsz)
+            if name in self.specs and self.specs[name][:4] != spec:
+                raise ValueError(f"Model '{name}' is already registered with different settings")
+            self.specs[name] = spec + (calibration_frames,)
+            self.locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        """The shared model, loaded on first call. Concurrent first calls load it only once."""
+        model = self.models.get(name)
+        if model is not None:
+            return model
+        if name not in self.specs:
+            raise KeyError(f"Model '{name}' is not registered")
+        with self.locks[name]:
+            if name not in self.models:
+                weights, backend, int8, imgsz, calibration_frames = self.specs[name]
+                start = time.perf_counter()
+                self.models[name] = load_detector(weights, backend, int8, calibration_frames, imgsz)
+                self.timings.setdefault(name, {})["load_seconds"] = time.perf_counter() - start
+        return self.models[name]
+
+    def load(self, names=None):
+        """Load several models at once, in parallel threads. Returns {name: model}."""
+        names = list(self.specs) if names is None else list(names)
+        with ThreadPoolExecutor(max_workers=max(1, len(names))) as pool:
+            return dict(zip(names, pool.map(self.get, names)))
+
+    def warm_up(self, names=None, frame_shape=WARMUP_FRAME_SHAPE, batch_sizes=(1,), runs=WARMUP_RUNS):
+        """Run `runs` dummy inferences per batch size on each model (loading it if needed)."""
+        names = list(self.specs) if names is None else list(names)
+        frame = np.zeros(frame_shape, dtype=np.uint8)
+        for name in names:
+            model = self.get(name)
+            start = time.perf_counter()
+            for batch_size in sorted(set(batch_sizes)):
+                for _ in range(runs):
+                    model([frame] * batch_size, verbose=False)
+            self.timings[name]["warmup_seconds"] = time.perf_counter() - start
+
+    def report(self):
+        """One line per model with its load and warm-up time."""
+        lines = []
+        for name, timing in self.timings.items():
+            weights, backend = self.specs[name][:2]
+            line = f"{name}: {weights} ({backend}) loaded in {timing['load_seconds']:.2f}s"
+            if "warmup_seconds" in timing:
+                line += f", warm-up {timing['warmup_seconds']:.2f}s"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+# One registry per process
+registry = ModelRegistry()
@@ -0,0 +1,475 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from batching import MAX_BATCH_SIZE, MAX_WAIT_SECONDS, FrameBatcher, predict_batch
+from detection_log import DetectionLogWriter
+from detection_scheduler import AmbulanceScheduler
+from emergency_state import EmergencyStateMachine
+from file_names import safe_filename
+from line_counter import LineCounter
+from keyframe_tracker import PROPAGATION_METHOD, TrackPropagator
+from metrics import PipelineMetrics
+from motion_gate import MotionGate
+from queue_zones import ZoneMap
+from ring_buffer import RingBuffer
+from shm_transport import SharedFrameStream
+from stream_capture import VideoStream
+from stream_processor import AMBULANCE_PRIORITY_SECONDS, StreamProcessor, annotate_frame
+from tracking import StreamTracker
+
+# --- Configuration ---
+# Annotated frames waiting to be drawn; older ones are dropped when rendering lags
+RENDER_QUEUE_SIZE = 2
+RENDER_POLL_SECONDS = 0.05
+# During an ambulance override, still count traffic on every Nth frame (0 = never)
+OVERRIDE_GENERAL_EVERY = 5
+
+# ---------------------
+
+
+def same_zones(a, b):
+    """Whether two lists of (name, polygon) describe the same zones."""
+    return len(a) == len(b) and all(
+        name_a == name_b and np.array_equal(polygon_a, polygon_b) for (name_a, polygon_a), (name_b, polygon_b) in zip(a, b))
+
+
+class MultiStreamRunner:
+    """
+    Serves several video sources from one process.
+
+    Every source gets its own capture thread (VideoStream) and its own
+    decision state (StreamProcessor), but all of them share a single pair
+    of models, so the weights are loaded once per process. Frames from all
+    streams are batched together so each model call covers several cameras.
+
+    With show=False and no video_dir the runner is headless: nothing is drawn
+    at all and only the structured decisions are produced. video_dir adds an
+    annotated MP4 per stream containing every video_every-th frame.
+    ambulance_model may be None to produce traffic decisions only.
+
+    With an AdaptiveController the general model's image size and frame
+    stride follow the load. With motion_gate (a dict of MotionGate options,
+    {} for the defaults) the general model is also skipped on frames where
+    nothing moved inside the queue zones. With keyframe_interval > 1 the
+    general model only runs on every keyframe_interval-th frame of a stream.
+    Frames skipped for any of these reasons get the last keyframe's tracks
+    moved along by a TrackPropagator, or the last tracked detections
+    unchanged without keyframes. Streams with an ambulance candidate are
+    never skipped.
+
+    The ambulance override of each stream is driven by an
+    EmergencyStateMachine (options in emergency_kwargs); the first counting
+    line, if any, serves as its stop line. While it is active the general
+    model still runs on every override_general_every-th frame, so counts and
+    queues do not freeze.
+
+    A source can also be a dict of VideoStream arguments with a "source"
+    key (e.g. its own name, roi or max_size). Stream names must be unique. Lines, zones, thresholds and
+    classes of a running stream can be changed with update_stream_settings().
+
+    With capture_processes=True every source is decoded in its own process
+    (SharedFrameStream) and frames reach this process through shared
+    memory, so decoding does not compete with inference for the GIL.
+
+    Stage timings, frame/drop counts and capture-to-decision latency are
+    collected in self.metrics (a PipelineMetrics), whether or not they are
+    exported.
+    """
+
+    def __init__(self, sources, general_model, ambulance_model, confidence=0.5, show=True,
+                 video_dir=None, video_every=1, scheduler_kwargs=None, counting_lines=None,
+                 queue_zones=None, record_dir=None, stream_kwargs=None,
+                 max_batch_size=MAX_BATCH_SIZE, max_wait_seconds=MAX_WAIT_SECONDS, metrics=None,
+                 controller=None, motion_gate=None, keyframe_interval=1, propagation=PROPAGATION_METHOD,
+                 emergency_kwargs=None, override_general_every=OVERRIDE_GENERAL_EVERY, capture_processes=False,
+                 **processor_kwargs):
+        self.general_model = general_model
+        self.ambulance_model = ambulance_model
+        self.confidence = confidence
+        self.show = show
+        self.video_dir = video_dir
+        self.video_every = max(1, video_every)
+        self.render = show or video_dir is not None
+        self.writers = {}
+        self.max_batch_size = max_batch_size
+        self.metrics = metrics or PipelineMetrics()
+        self.controller = controller
+        self.last_general = {}
+        # Capture times are time.monotonic(); decisions are stamped with wall-clock time
+        self.clock_offset = time.time() - time.monotonic()
+        self.file_origins = {}
+        # Frames delivered per stream since the general model last ran on it
+        self.frames_since_general = {}
+        self.override_general_every = override_general_every
+        self.motion_gate = motion_gate
+        self.pending_settings = {}
+        self.settings_lock = threading.Lock()
+
+        self.streams = []
+        self.processors = {}
+        self.gates = {}
+        self.propagators = {}
+        self.keyframe_interval = max(1, keyframe_interval)
+        stream_type = SharedFrameStream if capture_processes else VideoStream
+        for source in sources:
+            kwargs = dict(stream_kwargs or {})
+            if isinstance(source, dict):
+                kwargs.update(source)
+                source = kwargs.pop("source")
+            # Per-stream state is keyed by name, so two streams must not share one
+            name = kwargs.get("name") or str(source)
+            if name in self.processors:
+                raise ValueError(f"Duplicate stream name {name!r}; give each source its own name")
+            stream = stream_type(source, metrics=self.metrics, **kwargs)
+            self.streams.append(stream)
+            scheduler = AmbulanceScheduler(**(scheduler_kwargs or {}))
+            self.metrics.gauge(stream.name, "dropped_frames", lambda stream=stream: stream.dropped_frames)
+            self.metrics.gauge(stream.name, "ambulance_runs", lambda scheduler=scheduler: scheduler.runs)
+            self.metrics.gauge(stream.name, "ambulance_skips", lambda scheduler=scheduler: scheduler.skips)
+            line_counter = LineCounter(counting_lines) if counting_lines else None
+            zone_map = ZoneMap(queue_zones, stream.width, stream.height) if queue_zones else None
+            if motion_gate is not None:
+                self.gates[stream.name] = MotionGate(stream.width, stream.height, queue_zones, **motion_gate)
+            if self.keyframe_interval > 1:
+                self.propagators[stream.name] = TrackPropagator(stream.width, stream.height, propagation)
+            emergency = EmergencyStateMachine(
+                counting_lines[0] if counting_lines else None, zone_map,
+                max_override_seconds=processor_kwargs.get("priority_seconds", AMBULANCE_PRIORITY_SECONDS),
+                **(emergency_kwargs or {}))
+            self.processors[stream.name] = StreamProcessor(
+                stream.name, StreamTracker(frame_rate=stream.fps), scheduler, line_counter, zone_map,
+                emergency=emergency, **processor_kwargs)
+        # Optional binary detection log per stream, for replay without the models
+        self.loggers = {}
+        if record_dir is not None:
+            os.makedirs(record_dir, exist_ok=True)
+            for stream in self.streams:
+                self.loggers[stream.name] = DetectionLogWriter(
+                    os.path.join(record_dir, f"{safe_filename(stream.name)}.dtlog"))
+        self.batcher = FrameBatcher(self.streams, max_batch_size, max_wait_seconds)
+        # Frames still in use after their batch, by id: [stream, frame, holds].
+        # A frame's buffer goes back to its stream once the last hold is dropped.
+        self.held_frames = {}
+        self.key_frames = {}
+        self.frame_lock = threading.Lock()
+        self.render_buffer = RingBuffer(RENDER_QUEUE_SIZE, drop_oldest=True,
+                                        on_drop=lambda output: self._unhold(output[0], output[1]))
+        self.metrics.gauge("all", "render_dropped_frames", lambda: self.render_buffer.dropped)
+        if controller is not None:
+            self.metrics.gauge("all", "inference_imgsz", lambda: controller.imgsz)
+            self.metrics.gauge("all", "inference_stride", lambda: controller.stride)
+        self.stopping = threading.Event()
+        self.inference_thread = None
+
+    def update_stream_settings(self, name, **settings):
+        """
+        Change settings of a running stream: counting_lines, queue_zones,
+        low_threshold, high_threshold, vehicle_classes, priority_seconds or
+        trigger_classes. They are applied between two batches, so capture,
+        tracker and models keep running; only state that depends on a changed
+        setting (e.g. line totals for new lines) starts over.
+        """
+        if name not in self.processors:
+            raise ValueError(f"Unknown stream {name!r}")
+        with self.settings_lock:
+            self.pending_settings.setdefault(name, {}).update(settings)
+
+    def _apply_settings(self):
+        with self.settings_lock:
+            pending, self.pending_settings = self.pending_settings, {}
+        streams = {stream.name: stream for stream in self.streams}
+        for name, settings in pending.items():
+            stream, processor = streams[name], self.processors[name]
+            if "counting_lines" in settings:
+                lines = list(settings["counting_lines"] or [])
+                previous = processor.line_counter
+                if lines != (previous.lines if previous is not None else []):
+                    processor.line_counter = LineCounter(lines) if lines else None
+                    # Lines that did not change keep their totals
+                    if processor.line_counter is not None and previous is not None:
+                        processor.line_counter.carry_over(previous)
+                    processor.emergency.stop_line = lines[0] if lines else None
+            if "queue_zones" in settings:
+                zones = list(settings["queue_zones"] or [])
+                current = processor.zone_map
+                if not same_zones(zones, list(zip(current.names, current.polygons)) if current is not None else []):
+                    zone_map = ZoneMap(zones, stream.width, stream.height) if zones else None
+                    processor.zone_map = processor.emergency.zone_map = zone_map
+                    processor.lane_stats = None
+                    if name in self.gates:
+                        self.gates[name] = MotionGate(stream.width, stream.height, zones or None, **self.motion_gate)
+            if "low_threshold" in settings or "high_threshold" in settings:
+                low, high = processor.recommender.bounds
+                processor.recommender.bounds = [settings.get("low_threshold", low),
+                                                settings.get("high_threshold", high)]
+            if "vehicle_classes" in settings:
+                processor.vehicle_classes = set(settings["vehicle_classes"])
+            if "priority_seconds" in settings:
+                processor.priority_seconds = settings["priority_seconds"]
+                processor.emergency.max_override_seconds = settings["priority_seconds"]
+            if "trigger_classes" in settings:
+                processor.scheduler.trigger_classes = set(settings["trigger_classes"])
+
+    def _hold(self, stream, frame):
+        """Keep a frame's buffer from being reused until the matching _unhold()."""
+        with self.frame_lock:
+            entry = self.held_frames.setdefault(id(frame), [stream, frame, 0])
+            entry[2] += 1
+
+    def _unhold(self, stream, frame):
+        with self.frame_lock:
+            entry = self.held_frames[id(frame)]
+            entry[2] -= 1
+            if entry[2] > 0:
+                return
+            del self.held_frames[id(frame)]
+        stream.release(frame)
+
+    def _timed_predict(self, model, items, frames, stage, **predict_kwargs):
+        """predict_batch, with the batch time shared out evenly over the frames' streams."""
+        start = time.perf_counter()
+        results = predict_batch(model, frames, self.max_batch_size, conf=self.confidence, **predict_kwargs)
+        if frames:
+            per_frame = (time.perf_counter() - start) / len(frames)
+            for stream in items:
+                self.metrics.observe(stream.name, stage, per_frame)
+        return results
+
+    def _skip_general(self, stream, frame_index, frame, planned):
+        """
+        Why this frame can reuse the last detections instead of running the
+        general model: "keyframe" (between keyframes), "stride" (adaptive
+        controller), "static" (motion gate), or None if the model has to run.
+        planned maps stream names to the last frame index already picked for
+        the general model in the current batch.
+        """
+        scheduler = self.processors[stream.name].scheduler
+        if (stream.name not in self.last_general and stream.name not in planned) or (
+                scheduler is not None and (scheduler.candidate or scheduler.triggered)):
+            return None
+        propagator = self.propagators.get(stream.name)
+        if propagator is not None:
+            keyframe_index = planned.get(stream.name, propagator.keyframe_index)
+            if frame_index - keyframe_index < self.keyframe_interval:
+                return "keyframe"
+        if self.controller is not None and not self.controller.should_infer(self.frames_since_general[stream.name]):
+            return "stride"
+        gate = self.gates.get(stream.name)
+        if gate is not None and not gate.check(frame, frame_index):
+            return "static"
+        return None
+
+    def _frame_time(self, stream, frame_index, captured_at):
+        """
+        Wall-clock time a frame stands for. Live frames use their capture time;
+        file frames are spaced by the file's frame rate from its first frame, so
+        smoothing and dwell times do not depend on how fast it decodes.
+        """
+        if stream.live:
+            return captured_at + self.clock_offset
+        if stream.name not in self.file_origins:
+            self.file_origins[stream.name] = captured_at + self.clock_offset - frame_index / stream.fps
+        return self.file_origins[stream.name] + frame_index / stream.fps
+
+    def process_batch(self, batch):
+        """
+        Run both models on a batch of (stream, frame_index, frame, captured_at) items.
+
+        The ambulance model sees the frames its scheduler asks for; the general
+        model the frames whose stream is not in priority mode, plus every
+        override_general_every-th frame of a stream that is. Results are handed
+        back to each stream's own tracker in capture order. Every frame is
+        decided at its own time (see _frame_time), not at processing time.
+        Returns a list of (stream, frame, decision, ambulance_result, general_result).
+        """
+        times = [self._frame_time(stream, frame_index, captured_at)
+                 for stream, frame_index, _, captured_at in batch]
+        # The scheduler decides per frame whether the ambulance model has to run
+        ambulance_items = [i for i, (stream, frame_index, _, _) in enumerate(batch)
+                           if self.ambulance_model is not None
+                           and self.processors[stream.name].should_run_ambulance(frame_index, times[i])]
+        ambulance_frames = [batch[i][2] for i in ambulance_items]
+        ambulance_results = [None] * len(batch)
+        for i, result in zip(ambulance_items, self._timed_predict(
+                self.ambulance_model, [batch[i][0] for i in ambulance_items], ambulance_frames,
+                "ambulance_inference")):
+            ambulance_results[i] = result
+
+        outputs = []
+        pending = []
+        # Frames picked for the general model so far, so later frames of the
+        # same stream in this batch count from them rather than the last keyframe
+        planned = {}
+        reused = {}
+        priority = []
+        for (stream, frame_index, frame, _), ambulance_result, now in zip(batch, ambulance_results, times):
+            processor = self.processors[stream.name]
+            self.frames_since_general[stream.name] = self.frames_since_general.get(stream.name, 0) + 1
+            priority_active = processor.update_ambulance(ambulance_result, now)
+            priority.append(priority_active)
+            if priority_active:
+                if 0 < self.override_general_every <= self.frames_since_general[stream.name]:
+                    # Reduced-rate counting during the override
+                    outputs.append([stream, frame, None, ambulance_result, None])
+                    pending.append(len(outputs) - 1)
+                    planned[stream.name] = frame_index
+                    self.frames_since_general[stream.name] = 0
+                    continue
+                with self.metrics.timer(stream.name, "decision"):
+                    decision = processor.decision(frame_index, now, priority_active=True)
+                outputs.append([stream, frame, decision, ambulance_result, None])
+                continue
+            with self.metrics.timer(stream.name, "gate"):
+                skip_reason = self._skip_general(stream, frame_index, frame, planned)
+            outputs.append([stream, frame, None, ambulance_result, None])
+            if skip_reason is None:
+                pending.append(len(outputs) - 1)
+                planned[stream.name] = frame_index
+                self.frames_since_general[stream.name] = 0
+            else:
+                reused[len(outputs) - 1] = skip_reason
+
+        general_frames = [outputs[i][1] for i in pending]
+        predict_kwargs = {"imgsz": self.controller.imgsz} if self.controller is not None else {}
+        general_results = dict(zip(pending, self._timed_predict(
+            self.general_model, [outputs[i][0] for i in pending], general_frames, "general_inference",
+            **predict_kwargs)))
+
+        # In batch order, so each stream's tracker and counters see its frames in sequence
+        for i, output in enumerate(outputs):
+            stream = output[0]
+            processor = self.processors[stream.name]
+            if i in general_results:
+                with self.metrics.timer(stream.name, "tracking"):
+                    tracked = processor.track(general_results[i])
+                self.last_general[stream.name] = tracked
+                # The tracked result (and the propagator's template) refer to this frame
+                self._hold(stream, output[1])
+                previous = self.key_frames.get(stream.name)
+                self.key_frames[stream.name] = output[1]
+                if previous is not None:
+                    self._unhold(stream, previous)
+                if stream.name in self.propagators:
+                    self.propagators[stream.name].reset(tracked, output[1], batch[i][1])
+            elif i in reused:
+                # Counts, queues and the recommender keep updating from the propagated
+                # (or, without keyframes, the last) detections
+                if stream.name in self.propagators:
+                    with self.metrics.timer(stream.name, "propagation"):
+                        tracked = self.propagators[stream.name].propagate(output[1], batch[i][1])
+                else:
+                    tracked = self.last_general[stream.name]
+                self.metrics.increment(stream.name, f"general_skipped_{reused[i]}")
+            else:
+                continue
+            with self.metrics.timer(stream.name, "decision"):
+                processor.update_traffic(tracked, batch[i][1], times[i])
+                output[2] = processor.decision(batch[i][1], times[i], priority_active=priority[i])
+            output[4] = tracked
+            # Reused and propagated frames are logged too, so a replay sees every counted frame
+            if stream.name in self.loggers:
+                self.loggers[stream.name].write_result(batch[i][1], output[2]["timestamp"], tracked)
+
+        # Change detection has to see each stream's decisions in frame order
+        for stream, _, decision, _, _ in outputs:
+            self.processors[stream.name].publish(decision)
+        return [tuple(output) for output in outputs]
+
+    def _inference_loop(self, on_decision):
+        """Inference stage: batches in, decisions out, annotated work to the render stage."""
+        try:
+            while not self.stopping.is_set() and not all(stream.done for stream in self.streams):
+                if self.pending_settings:
+                    self._apply_settings()
+                batch = self.batcher.next_batch()
+                worst_latency = 0.0
+                for stream, _, frame, _ in batch:
+                    self._hold(stream, frame)
+                for item, output in zip(batch, self.process_batch(batch)):
+                    stream, captured_at = item[0], item[3]
+                    if on_decision is not None:
+                        with self.metrics.timer(stream.name, "output"):
+                            on_decision(output[2])
+                    latency = time.monotonic() - captured_at
+                    worst_latency = max(worst_latency, latency)
+                    self.metrics.observe(stream.name, "capture_to_decision", latency)
+                    self.metrics.increment(stream.name, "frames")
+                    if self.show or (self.render and output[2]["frame_index"] % self.video_every == 0):
+                        # Never blocks: if rendering is slow, old frames are dropped
+                        self._hold(stream, output[1])
+                        if not self.render_buffer.put(output):
+                            self._unhold(stream, output[1])
+                    self._unhold(stream, output[1])
+                if self.controller is not None and batch:
+                    backlog = sum(len(s.frames) for s in self.streams) / sum(s.frames.capacity for s in self.streams)
+                    self.controller.update(worst_latency, backlog)
+        finally:
+            self.render_buffer.close()
+
+    def run(self, on_decision=None):
+        """
+        Runs the three stages: one capture thread per stream, one inference
+        thread, and rendering/output on the calling thread (OpenCV windows
+        must be driven from the main thread on some platforms).
+        """
+        for stream in self.streams:
+            stream.start()
+        inference_thread = self.inference_thread = threading.Thread(
+            target=self._inference_loop, args=(on_decision,), name="inference", daemon=True)
+        inference_thread.start()
+
+        try:
+            if self.render:
+                while True:
+                    output = self.render_buffer.get(timeout=RENDER_POLL_SECONDS)
+                    if output is None:
+                        if not inference_thread.is_alive():
+                            break
+                        continue
+                    stream, frame, decision, ambulance_result, general_result = output
+                    with self.metrics.timer(stream.name, "render"):
+                        final_frame = annotate_frame(frame, decision, ambulance_result, general_result)
+                    if self.video_dir is not None and decision["frame_index"] % self.video_every == 0:
+                        with self.metrics.timer(stream.name, "video_write"):
+                            self._writer(stream, final_frame).write(final_frame)
+                    self._unhold(stream, frame)
+                    if self.show:
+                        cv2.imshow(f"Traffic Management - {stream.name}", final_frame)
+                        if cv2.waitKey(1) & 0xFF == ord('q'):
+                            break
+            else:
+                while inference_thread.is_alive():
+                    inference_thread.join(timeout=RENDER_POLL_SECONDS)
+        finally:
+            self.stop()
+
+    def _writer(self, stream, frame):
+        """Annotated output video for one stream, opened on its first frame."""
+        if stream.name not in self.writers:
+            os.makedirs(self.video_dir, exist_ok=True)
+            path = os.path.join(self.video_dir, f"{safe_filename(stream.name)}.mp4")
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            fps = max(1, stream.fps / self.video_every)
+            self.writers[stream.name] = cv2.VideoWriter(path, fourcc, fps, (frame.shape[1], frame.shape[0]))
+        return self.writers[stream.name]
+
+    def stop(self):
+        self.stopping.set()
+        for stream in self.streams:
+            stream.stop()
+        self.render_buffer.close()
+        # The inference thread may still be writing the last batch's log records
+        if self.inference_thread is not None and self.inference_thread is not threading.current_thread():
+            self.inference_thread.join()
+        for writer in self.writers.values():
+            writer.release()
+        self.writers.clear()
+        for logger in self.loggers.values():
+            logger.close()
+        self.loggers.clear()
+        if self.show:
+            cv2.destroyAllWindows()
@@ -0,0 +1,208 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# --- Configuration ---
+MIN_GREEN_SECONDS = 10
+MAX_GREEN_SECONDS = 60
+MIN_CYCLE_SECONDS = 40
+MAX_CYCLE_SECONDS = 120
+# Yellow + all-red time lost at every phase change
+LOST_TIME_PER_PHASE = 4
+# Vehicles per hour of green one approach discharges
+SATURATION_FLOW = 1800
+# Cycle length used by max-pressure, which splits a fixed cycle
+DEFAULT_CYCLE_SECONDS = 90
+# Webster's formula becomes unstable as the flow ratio sum approaches 1
+MAX_FLOW_RATIO = 0.95
+
+# ---------------------
+
+Phase = namedtuple("Phase", ["name", "approaches"])
+PhasePlan = namedtuple("PhasePlan", ["cycle", "greens", "method"])
+
+
+def allocate_greens(weights, available, min_green=MIN_GREEN_SECONDS, max_green=MAX_GREEN_SECONDS):
+    """
+    Split `available` green seconds over phases in proportion to `weights`,
+    keeping every phase within [min_green, max_green].
+
+    weights is (intersections, phases) and available is (intersections,), so
+    any number of intersections is solved at once. Phases below min_green
+    are fixed there first and the rest is re-split among the others, then
+    the same for phases above max_green; each phase is fixed at most once.
+    """
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    available = np.broadcast_to(np.asarray(available, dtype=np.float64), weights.shape[:1])
+    n_phases = weights.shape[1]
+    # Without any demand, split evenly
+    weights = np.where(weights.sum(axis=1, keepdims=True) > 0, np.maximum(weights, 0), 1.0)
+
+    greens = np.zeros_like(weights)
+    fixed = np.zeros(weights.shape, dtype=bool)
+    for _ in range(2 * n_phases + 1):
+        remaining = available - np.where(fixed, greens, 0).sum(axis=1)
+        free_weights = np.where(fixed, 0, weights)
+        total = free_weights.sum(axis=1, keepdims=True)
+        share = np.divide(free_weights, total, out=np.zeros_like(free_weights), where=total > 0)
+        greens = np.where(fixed, greens, share * remaining[:, None])
+
+        # Minimums first: raising a phase only takes time from the others
+        low = ~fixed & (greens < min_green)
+        if low.any():
+            greens = np.where(low, min_green, greens)
+            fixed |= low
+            continue
+        high = ~fixed & (greens > max_green)
+        if not high.any():
+            break
+        greens = np.where(high, max_green, greens)
+        fixed |= high
+    return greens
+
+
+def webster(flows, lost_time_per_phase=LOST_TIME_PER_PHASE, saturation_flow=SATURATION_FLOW,
+            min_cycle=MIN_CYCLE_SECONDS, max_cycle=MAX_CYCLE_SECONDS,
+            min_green=MIN_GREEN_SECONDS, max_green=MAX_GREEN_SECONDS):
+    """
+    Webster's optimum cycle and green split for (intersections, phases)
+    critical flows in vehicles per hour. Returns (cycles, greens).
+    """
+    flows = np.atleast_2d(np.asarray(flows, dtype=np.float64))
+    n_phases = flows.shape[1]
+    ratios = flows / saturation_flow
+    total_ratio = np.minimum(ratios.sum(axis=1), MAX_FLOW_RATIO)
+    lost_time = lost_time_per_phase * n_phases
+
+    cycles = (1.5 * lost_time + 5) / (1 - total_ratio)
+    # The cycle also has to fit every phase's minimum and maximum green
+    cycles = np.clip(cycles, max(min_cycle, lost_time + n_phases * min_green),
+                     min(max_cycle, lost_time + n_phases * max_green))
+    return cycles, allocate_greens(ratios, cycles - lost_time, min_green, max_green)
+
+
+def max_pressure(queues, downstream=None, cycle=DEFAULT_CYCLE_SECONDS, lost_time_per_phase=LOST_TIME_PER_PHASE,
+                 min_green=MIN_GREEN_SECONDS, max_green=MAX_GREEN_SECONDS):
+    """
+    Green split of a fixed cycle in proportion to each phase's pressure
+    (upstream queue minus downstream queue, floored at zero).
+    Returns (cycles, greens) like webster(). Where min_green or max_green
+    keep the greens from filling the cycle exactly, the returned cycle is
+    the one they actually add up to.
+    """
+    queues = np.atleast_2d(np.asarray(queues, dtype=np.float64))
+    pressure = queues if downstream is None else queues - np.atleast_2d(downstream)
+    lost_time = lost_time_per_phase * queues.shape[1]
+    available = np.full(queues.shape[0], float(cycle) - lost_time)
+    greens = allocate_greens(np.maximum(pressure, 0), available, min_green, max_green)
+    return greens.sum(axis=1) + lost_time, greens
+
+
+class PhaseOptimizer:
+    """
+    Plans green splits for one intersection from per-approach demand.
+
+    Each phase serves one or more approaches (stream names); its demand is
+    that of its busiest approach. "webster" turns demand into hourly flows
+    and computes the optimum cycle and split; "max_pressure" splits a fixed
+    cycle by queue length. For many intersections at once, call webster()
+    or max_pressure() directly with one row per intersection.
+    """
+
+    def __init__(self, phases, method="webster", min_green=MIN_GREEN_SECONDS, max_green=MAX_GREEN_SECONDS,
+                 min_cycle=MIN_CYCLE_SECONDS, max_cycle=MAX_CYCLE_SECONDS,
+                 lost_time_per_phase=LOST_TIME_PER_PHASE, saturation_flow=SATURATION_FLOW,
+                 cycle=DEFAULT_CYCLE_SECONDS):
+        if method not in ("webster", "max_pressure"):
+            raise ValueError(f"Unknown method {method!r}")
+        self.phases = [Phase(name, list(approaches)) for name, approaches in phases]
+        self.method = method
+        self.min_green = min_green
+        self.max_green = max_green
+        self.min_cycle = min_cycle
+        self.max_cycle = max_cycle
+        self.lost_time_per_phase = lost_time_per_phase
+        self.saturation_flow = saturation_flow
+        self.cycle = cycle
+
+    def phase_demand(self, demand):
+        """Critical (largest) approach demand per phase; unknown approaches count as 0."""
+        return np.array([max((demand.get(a, 0.0) for a in phase.approaches), default=0.0)
+                         for phase in self.phases])
+
+    def plan(self, demand):
+        """
+        demand maps approach -> vehicles per hour for "webster", or
+        approach -> queue length for "max_pressure".
+        """
+        values = self.phase_demand(demand)
+        if self.method == "webster":
+            cycles, greens = webster(values, self.lost_time_per_phase, self.saturation_flow,
+                                     self.min_cycle, self.max_cycle, self.min_green, self.max_green)
+        else:
+            cycles, greens = max_pressure(values, None, self.cycle, self.lost_time_per_phase,
+                                          self.min_green, self.max_green)
+        return PhasePlan(round(float(cycles[0]), 1),
+                         {phase.name: round(float(g), 1) for phase, g in zip(self.phases, greens[0])},
+                         self.method)
+
+
+class CyclePlanner:
+    """
+    Feeds live decisions into a PhaseOptimizer and re-plans once per cycle.
+
+    Demand per approach is the vehicles waiting (lane queues, or the smoothed
+    count without zones) at the end of the cycle. For Webster this is turned
+    into an hourly arrival rate over the last cycle. The first plan waits
+    until every approach of every phase has reported, so a phase is never
+    planned as empty just because its camera started late. on_plan is called
+    with every new PhasePlan. Assigning a new optimizer (e.g. after the phases
+    were reloaded) starts over with that wait.
+    """
+
+    def __init__(self, optimizer, on_plan=None):
+        self.on_plan = on_plan
+        self.queues = {}
+        self.optimizer = optimizer
+
+    @property
+    def optimizer(self):
+        return self._optimizer
+
+    @optimizer.setter
+    def optimizer(self, optimizer):
+        self._optimizer = optimizer
+        self.approaches = {a for phase in optimizer.phases for a in phase.approaches}
+        self.queues = {a: q for a, q in self.queues.items() if a in self.approaches}
+        self.plan = None
+        self.next_plan_time = None
+
+    def add(self, decision):
+        if decision["ambulance"]:
+            return
+        lanes = decision.get("lanes")
+        if lanes:
+            queue = sum(lane["queue_length"] for lane in lanes)
+        else:
+            queue = decision["smoothed_count"] if decision["smoothed_count"] is not None else decision["vehicle_count"]
+        self.queues[decision["stream"]] = queue
+
+        now = decision["timestamp"]
+        if self.plan is None and not self.approaches <= self.queues.keys():
+            return
+        if self.next_plan_time is None or now >= self.next_plan_time:
+            self.replan(now)
+
+    def replan(self, now=None):
+        now = time.time() if now is None else now
+        cycle = self.plan.cycle if self.plan is not None else self.optimizer.cycle
+        if self.optimizer.method == "webster":
+            demand = {a: q * 3600 / cycle for a, q in self.queues.items()}
+        else:
+            demand = dict(self.queues)
+        self.plan = self.optimizer.plan(demand)
+        self.next_plan_time = now + self.plan.cycle
+        if self.on_plan is not None:
+            self.on_plan(self.plan)
+        return self.plan
@@ -0,0 +1,125 @@
+import json
+import time
+
+import cv2
+import numpy as np
+
+# --- Configuration ---
+ZONE_COLORS = [(0, 255, 0), (255, 128, 0), (0, 128, 255), (255, 0, 255), (0, 255, 255), (128, 0, 255)]
+
+# ---------------------
+
+
+def load_zones(path):
+    """
+    Read per-lane queue zones from a JSON file:
+
+        {"zones": [{"name": "north_left", "polygon": [[x, y], [x, y], ...]}, ...]}
+
+    Returns a list of (name, polygon) with polygons as int32 arrays.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    return parse_zones(config["zones"])
+
+
+def parse_zones(entries):
+    """[{"name": ..., "polygon": [[x, y], ...]}, ...] -> list of (name, int32 polygon)."""
+    zones = []
+    for zone in entries:
+        polygon = np.array(zone["polygon"], dtype=np.int32).reshape(-1, 2)
+        if len(polygon) < 3:
+            raise ValueError(f"Zone {zone['name']!r} needs at least 3 points")
+        zones.append((zone["name"], polygon))
+    return zones
+
+
+def full_frame_zone(frame_width, frame_height, name="all"):
+    """A single zone covering the whole frame, like the original QUEUE_ZONE_POLYGON."""
+    polygon = np.array([[0, 0], [frame_width, 0], [frame_width, frame_height], [0, frame_height]], np.int32)
+    return [(name, polygon)]
+
+
+class ZoneMap:
+    """
+    Per-lane queue zones rasterised once into a label mask.
+
+    label_mask[y, x] is 0 outside every zone and lane_index + 1 inside one
+    (later zones win where they overlap), so assigning all detections of a
+    frame to lanes is a single fancy-indexing operation instead of one
+    pointPolygonTest per detection.
+    """
+
+    def __init__(self, zones, frame_width, frame_height):
+        if len(zones) > 254:
+            raise ValueError("At most 254 zones are supported")
+        self.names = [name for name, _ in zones]
+        self.polygons = [polygon for _, polygon in zones]
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+
+        self.label_mask = np.zeros((frame_height, frame_width), dtype=np.uint8)
+        for i, polygon in enumerate(self.polygons):
+            cv2.fillPoly(self.label_mask, [polygon], i + 1)
+        self.zone_areas = np.bincount(self.label_mask.ravel(), minlength=len(zones) + 1)[1:].astype(np.float64)
+
+        # The colour overlay is also built once and only blended when drawing
+        self.overlay = np.zeros((frame_height, frame_width, 3), dtype=np.uint8)
+        for i, polygon in enumerate(self.polygons):
+            cv2.fillPoly(self.overlay, [polygon], ZONE_COLORS[i % len(ZONE_COLORS)])
+        self.overlay_mask = self.label_mask > 0
+
+        # lane index -> {track_id: time it entered the lane}
+        self.entered = [dict() for _ in self.polygons]
+
+    def assign(self, centers):
+        """Lane index per centre point, -1 for points outside every zone."""
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        xs = centers[:, 0].astype(np.int64)
+        ys = centers[:, 1].astype(np.int64)
+        in_frame = (xs >= 0) & (xs < self.frame_width) & (ys >= 0) & (ys < self.frame_height)
+        lanes = np.full(len(centers), -1, dtype=np.int64)
+        lanes[in_frame] = self.label_mask[ys[in_frame], xs[in_frame]].astype(np.int64) - 1
+        return lanes
+
+    def update(self, track_ids, boxes_xywh, now=None):
+        """
+        Feed the tracked vehicles of one frame.
+
+        Returns one dict per lane with:
+        queue_length  vehicles whose centre is inside the lane zone
+        occupancy     box area of those vehicles / zone area (approximate, capped at 1)
+        mean_dwell / max_dwell  seconds the current queue members have been in the lane
+        """
+        now = time.time() if now is None else now
+        track_ids = np.asarray(track_ids, dtype=np.int64).reshape(-1)
+        boxes_xywh = np.asarray(boxes_xywh, dtype=np.float64).reshape(-1, 4)
+        lanes = self.assign(boxes_xywh[:, :2])
+
+        n = len(self.names)
+        inside = lanes >= 0
+        queue_lengths = np.bincount(lanes[inside], minlength=n)
+        box_areas = np.bincount(lanes[inside], weights=boxes_xywh[inside, 2] * boxes_xywh[inside, 3], minlength=n)
+        occupancy = np.minimum(box_areas / np.maximum(self.zone_areas, 1), 1.0)
+
+        stats = []
+        for i, name in enumerate(self.names):
+            members = track_ids[lanes == i].tolist()
+            previous = self.entered[i]
+            # Only current members are kept, so this never grows past the queue itself
+            self.entered[i] = {tid: previous.get(tid, now) for tid in members}
+            dwell = [now - t for t in self.entered[i].values()]
+            stats.append({
+                "lane": name,
+                "queue_length": int(queue_lengths[i]),
+                "occupancy": round(float(occupancy[i]), 3),
+                "mean_dwell": round(float(sum(dwell)) / len(dwell), 2) if dwell else 0.0,
+                "max_dwell": round(float(max(dwell)), 2) if dwell else 0.0,
+            })
+        return stats
+
+    def draw(self, frame, alpha=0.3):
+        """Blend the precomputed zone overlay into the frame (in place)."""
+        blended = cv2.addWeighted(self.overlay, alpha, frame, 1 - alpha, 0)
+        frame[self.overlay_mask] = blended[self.overlay_mask]
+        return frame
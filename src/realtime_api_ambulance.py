@@ -1,106 +1,322 @@
-import cv2
-import time
-from ultralytics import YOLO
+import argparse
+import json
+import sys
+
+from adaptive_control import AdaptiveController
+from detector_backends import BACKENDS, sample_frames
+from intersection_config import ConfigWatcher, restart_required, stream_settings, stream_source
+from line_counter import CountingLine
+from metrics import PipelineMetrics
+from model_registry import WARMUP_RUNS, registry
+from multi_stream import MultiStreamRunner
+from phase_optimizer import CyclePlanner, PhaseOptimizer
+from queue_zones import load_zones
+from signal_output import SignalPublisher
+from stats_aggregator import StatsAggregator
 
 # --- Configuration ---
-VIDEO_SOURCE = 0 
-AMBULANCE_MODEL_PATH = "best.pt" 
-GENERAL_MODEL = YOLO("yolov8n.pt")
+# One entry per camera: webcam index, video file or "rtsp://..." URL.
+# Can be overridden on the command line: --source 0 --source rtsp://...
+VIDEO_SOURCES = [0]
+AMBULANCE_MODEL_PATH = "best.pt"
+GENERAL_MODEL_PATH = "yolov8n.pt"
+# Inference backend: "torch", "onnx" or "openvino" (exported once, next to the weights)
+BACKEND = "torch"
 CONFIDENCE_THRESHOLD = 0.5
 LOW_THRESHOLD = 5
 HIGH_THRESHOLD = 10
+# Longest single ambulance override; it normally ends as soon as the vehicle
+# crosses the first counting line or leaves the picture
 AMBULANCE_PRIORITY_SECONDS = 20
+# An ambulance must be seen in CONFIRM_HITS of CONFIRM_WINDOW ambulance-model
+# frames, as the same vehicle, before the override starts
+AMBULANCE_CONFIRM_HITS = 3
+AMBULANCE_CONFIRM_WINDOW = 5
+# Keep counting traffic on every Nth frame during an override (0 = never)
+OVERRIDE_GENERAL_EVERY = 5
+# Frames from all cameras are batched into one model call
+MAX_BATCH_SIZE = 8
+MAX_WAIT_SECONDS = 0.01
+# Ambulance model schedule: every Nth frame (1 = every frame), at least every
+# AMBULANCE_MAX_INTERVAL_SECONDS, and on every frame while a candidate is in view
+AMBULANCE_EVERY_N_FRAMES = 5
+AMBULANCE_MAX_INTERVAL_SECONDS = 0.5
+# Optional counting lines applied to every camera, counted in both directions,
+# e.g. [CountingLine("stop_line", (0, 360), (1280, 360))]
+COUNTING_LINES = []
+# Crop every camera to this region (x, y, w, h) and/or downscale so the longest
+# side is at most CAPTURE_MAX_SIZE, once, right after decoding. Zones and lines
+# are then given in the processed frame's coordinates.
+CAPTURE_ROI = None
+CAPTURE_MAX_SIZE = None
+# Optional per-lane queue zones (JSON, see queue_zones.load_zones)
+QUEUE_ZONES_FILE = None
+# Capture-to-decision latency budget in seconds. When set, the general model's
+# image size and frame stride are lowered under load (see adaptive_control.py)
+LATENCY_BUDGET_SECONDS = None
+# Skip the general model on frames where nothing moved inside the queue zones
+# (or the whole frame without zones); see motion_gate.py for the thresholds
+MOTION_GATE = False
+# Run the general model on every Nth frame only and move the tracks along with
+# optical flow ("flow") or constant velocity ("velocity") in between (1 = off)
+KEYFRAME_INTERVAL = 1
+PROPAGATION = "flow"
+# Decode every camera in its own process and pass frames through shared memory
+CAPTURE_PROCESSES = False
+# Dummy inferences per model before the cameras start (0 disables warm-up)
+MODEL_WARMUP_RUNS = WARMUP_RUNS
+# Optional signal controller that receives phase-change and ambulance-override
+# events over UDP as "host:port" (see signal_output.py / controller_stub.py)
+CONTROLLER_ADDRESS = None
+INTERSECTION_NAME = "default"
+# Phases of the intersection for --plan, as (phase name, [stream names it serves]);
+# None gives every stream its own phase
+PHASES = None
+# Per-stage timing metrics: Prometheus endpoint on this port and/or a JSON file
+# rewritten every METRICS_DUMP_SECONDS
+METRICS_PORT = None
+METRICS_FILE = None
+METRICS_DUMP_SECONDS = 10.0
+# Optional deployment config (JSON, see intersection_config.py) replacing the
+# sources, models, lines, zones, classes and thresholds above. Lines, zones,
+# classes, thresholds, confidence and phases are reloaded when the file changes.
+CONFIG_FILE = None
 
 # ---------------------
 
-# 1. Load Models
-try:
-    ambulance_model = YOLO(AMBULANCE_MODEL_PATH)
-except Exception as e:
-    print(f"Error loading ambulance model: {e}")
-    print("Make sure 'best.pt' is in the same folder as the script.")
-    exit()
-
-# 2. Open Video Source
-cap = cv2.VideoCapture(VIDEO_SOURCE)
-if not cap.isOpened():
-    print("Error: Could not open video source.")
-    exit()
-
-ambulance_detected_time = None
-
-# 3. Main Loop
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
-    
-    final_frame = frame.copy()
-    ambulance_present = False
-
-    # --- Ambulance Detection ---
-    ambulance_results = ambulance_model(frame, conf=CONFIDENCE_THRESHOLD, verbose=False)
-    
-    for result in ambulance_results:
-        if len(result.boxes) > 0:
-            ambulance_present = True
-            for box in result.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                # --- THIS IS THE FIX ---
-                # Use ambulance_model.names to get the class name
-                cls_name = ambulance_model.names[int(box.cls[0])]
-                conf = float(box.conf[0])
-                
-                cv2.rectangle(final_frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                cv2.putText(final_frame, f"{cls_name} {conf:.2f}", (x1, y1 - 10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-
-    # --- Ambulance Priority Override ---
-    if ambulance_present:
-        if ambulance_detected_time is None:
-            ambulance_detected_time = time.time()
-
-        elapsed_time = time.time() - ambulance_detected_time
-        
-        if elapsed_time < AMBULANCE_PRIORITY_SECONDS:
-            status = "AMBULANCE DETECTED"
-            recommendation = "IMMEDIATE GREEN LIGHT"
-            color = (0, 0, 255)
-            timer_text = f"Priority Timer: {int(AMBULANCE_PRIORITY_SECONDS - elapsed_time)}s"
-            cv2.putText(final_frame, timer_text, (50, 170), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
-        else:
-            ambulance_detected_time = None
-    
-    # --- Normal Traffic Logic ---
-    if not ambulance_present or ambulance_detected_time is None:
-        ambulance_detected_time = None
-        general_results = GENERAL_MODEL.track(frame, persist=True, conf=CONFIDENCE_THRESHOLD, verbose=False)
-        
-        vehicle_count = 0
-        if general_results[0].boxes is not None and general_results[0].boxes.id is not None:
-            class_ids = general_results[0].boxes.cls.int().cpu().tolist()
-            vehicle_count = sum(1 for cid in class_ids if cid in [2, 3, 5, 7])
-
-        if vehicle_count <= LOW_THRESHOLD:
-            status, recommendation, color = "Light Traffic", "Green Time: 20s", (0, 255, 0)
-        elif vehicle_count <= HIGH_THRESHOLD:
-            status, recommendation, color = "Moderate Traffic", "Green Time: 45s", (0, 255, 255)
-        else:
-            status, recommendation, color = "Heavy Traffic", "Green Time: 60s", (0, 0, 255)
-        
-        final_frame = general_results[0].plot(img=final_frame)
-        cv2.putText(final_frame, f"Total Vehicle Count: {vehicle_count}", (50, 50), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-
-    # --- Display Information ---
-    cv2.putText(final_frame, f"Status: {status}", (50, 90), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
-    cv2.putText(final_frame, f"Recommendation: {recommendation}", (50, 130), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
-
-    cv2.imshow("Final Traffic Management System", final_frame)
-
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-# 4. Cleanup
-cap.release()
-cv2.destroyAllWindows()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Real-time traffic management with ambulance priority.")
+    parser.add_argument("--config", default=CONFIG_FILE,
+                        help="Deployment config file; tuning changes are applied while running.")
+    parser.add_argument("--source", action="append", dest="sources",
+                        help="Video source (index, file or RTSP URL). Repeat for several cameras.")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE,
+                        help="Maximum number of frames per model call.")
+    parser.add_argument("--max-wait", type=float, default=MAX_WAIT_SECONDS,
+                        help="Seconds to wait for a batch to fill before running it.")
+    parser.add_argument("--ambulance-every", type=int, default=AMBULANCE_EVERY_N_FRAMES,
+                        help="Run the ambulance model every Nth frame when no candidate is in view.")
+    parser.add_argument("--roi", type=lambda v: tuple(int(p) for p in v.split(",")), default=CAPTURE_ROI,
+                        metavar="X,Y,W,H", help="Crop frames to this region before inference.")
+    parser.add_argument("--max-size", type=int, default=CAPTURE_MAX_SIZE,
+                        help="Downscale frames so the longest side is at most this many pixels.")
+    parser.add_argument("--no-hw-decode", action="store_true",
+                        help="Disable hardware-accelerated decoding.")
+    parser.add_argument("--capture-processes", action="store_true", default=CAPTURE_PROCESSES,
+                        help="Decode each source in a separate process (frames shared, not copied).")
+    parser.add_argument("--latency-budget", type=float, default=LATENCY_BUDGET_SECONDS,
+                        help="Lower the general model's image size / frame rate to stay within this latency (s).")
+    parser.add_argument("--motion-gate", action="store_true", default=MOTION_GATE,
+                        help="Reuse the last detections on frames without motion (forced refresh every second).")
+    parser.add_argument("--keyframe-every", type=int, default=KEYFRAME_INTERVAL,
+                        help="Detect on every Nth frame and propagate tracks in between.")
+    parser.add_argument("--propagation", choices=["flow", "velocity"], default=PROPAGATION,
+                        help="How tracks are moved between keyframes.")
+    parser.add_argument("--backend", choices=BACKENDS, default=BACKEND,
+                        help="Run the models through PyTorch, ONNX Runtime or OpenVINO.")
+    parser.add_argument("--int8", action="store_true",
+                        help="Use INT8-quantized models (onnx/openvino only).")
+    parser.add_argument("--calibration-video",
+                        help="Video whose frames calibrate INT8 quantization.")
+    parser.add_argument("--zones", default=QUEUE_ZONES_FILE,
+                        help="JSON file with per-lane queue zones.")
+    parser.add_argument("--record", metavar="DIR",
+                        help="Record every stream's detections to a binary log in DIR for later replay.")
+    parser.add_argument("--headless", action="store_true",
+                        help="No drawing and no windows; print one JSON decision per frame.")
+    parser.add_argument("--results", help="Write the JSON decisions to this file instead of stdout.")
+    parser.add_argument("--changes-only", action="store_true",
+                        help="Only output decisions that differ from the previous one of the same stream.")
+    parser.add_argument("--controller", metavar="HOST:PORT", default=CONTROLLER_ADDRESS,
+                        help="Send phase-change and ambulance-override events to a signal controller over UDP.")
+    parser.add_argument("--intersection", default=INTERSECTION_NAME,
+                        help="Intersection name used in controller events.")
+    parser.add_argument("--plan", choices=["webster", "max_pressure"],
+                        help="Plan a green split over all streams (approaches) once per cycle.")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Serve per-stage timings at http://HOST:PORT/metrics (Prometheus) and /metrics.json.")
+    parser.add_argument("--metrics-file", default=METRICS_FILE,
+                        help="Periodically write per-stage timings to this JSON file.")
+    parser.add_argument("--stats", metavar="DIR",
+                        help="Aggregate flow, queues and class mix per minute/hour/day into DIR.")
+    parser.add_argument("--save-video", metavar="DIR",
+                        help="Write an annotated MP4 per stream into DIR.")
+    parser.add_argument("--video-every", type=int, default=1,
+                        help="Only annotate and save every Nth frame of each stream.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sources = args.sources or VIDEO_SOURCES
+    general_path, ambulance_path = GENERAL_MODEL_PATH, AMBULANCE_MODEL_PATH
+    confidence, intersection, phases = CONFIDENCE_THRESHOLD, args.intersection, PHASES
+    watcher = None
+    runner = planner = None
+    if args.config:
+
+        def on_reload(config, old):
+            changes = restart_required(old, config)
+            if changes:
+                print("Restart needed to apply: " + ", ".join(changes), file=sys.stderr)
+            names = {stream.name for stream in runner.streams}
+            for camera in config["cameras"]:
+                if camera["name"] in names:
+                    runner.update_stream_settings(camera["name"], **stream_settings(camera))
+            runner.confidence = config["confidence"]
+            if planner is not None:
+                planner.optimizer = PhaseOptimizer(
+                    config["phases"] or [(stream.name, [stream.name]) for stream in runner.streams], args.plan)
+            print(f"Config reloaded from {args.config}", file=sys.stderr)
+
+        try:
+            watcher = ConfigWatcher(args.config, on_reload)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            exit()
+        config = watcher.config
+        sources = [stream_source(camera) for camera in config["cameras"]]
+        models = config["models"]
+        general_path, ambulance_path = models["general"], models["ambulance"]
+        args.backend, args.int8, args.calibration_video = models["backend"], models["int8"], models["calibration_video"]
+        confidence, intersection, phases = config["confidence"], config["intersection"], config["phases"]
+
+    # 1. Load Models (once, shared by every stream)
+    calibration_frames = None
+    if args.int8:
+        if args.backend == "torch":
+            print("Error: --int8 needs --backend onnx or openvino")
+            exit()
+        if not args.calibration_video:
+            print("Error: --int8 needs --calibration-video")
+            exit()
+        calibration_frames = sample_frames(args.calibration_video)
+
+    registry.register("general", general_path, args.backend, args.int8, calibration_frames)
+    registry.register("ambulance", ambulance_path, args.backend, args.int8, calibration_frames)
+    try:
+        models = registry.load()
+    except Exception as e:
+        print(f"Error loading models: {e}")
+        print("Make sure 'best.pt' is in the same folder as the script.")
+        exit()
+    general_model, ambulance_model = models["general"], models["ambulance"]
+
+    # 2. Open Video Sources
+    metrics = PipelineMetrics()
+    try:
+        runner = MultiStreamRunner(
+            sources, general_model, ambulance_model,
+            confidence=confidence,
+            show=not args.headless,
+            video_dir=args.save_video,
+            video_every=args.video_every,
+            max_batch_size=args.batch_size,
+            max_wait_seconds=args.max_wait,
+            counting_lines=COUNTING_LINES,
+            queue_zones=load_zones(args.zones) if args.zones else None,
+            record_dir=args.record,
+            stream_kwargs={"roi": args.roi, "max_size": args.max_size, "hw_accel": not args.no_hw_decode},
+            scheduler_kwargs={
+                "every_n_frames": args.ambulance_every,
+                "max_interval_seconds": AMBULANCE_MAX_INTERVAL_SECONDS,
+            },
+            low_threshold=LOW_THRESHOLD,
+            high_threshold=HIGH_THRESHOLD,
+            priority_seconds=AMBULANCE_PRIORITY_SECONDS,
+            emergency_kwargs={"confirm_hits": AMBULANCE_CONFIRM_HITS, "confirm_window": AMBULANCE_CONFIRM_WINDOW},
+            override_general_every=OVERRIDE_GENERAL_EVERY,
+            metrics=metrics,
+            controller=AdaptiveController(args.latency_budget) if args.latency_budget else None,
+            motion_gate={} if args.motion_gate else None,
+            keyframe_interval=args.keyframe_every,
+            propagation=args.propagation,
+            capture_processes=args.capture_processes,
+        )
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}")
+        exit()
+    if watcher is not None:
+        for camera in watcher.config["cameras"]:
+            runner.update_stream_settings(camera["name"], **stream_settings(camera))
+
+    # Warm up at the frame size and batch sizes the streams will produce, so
+    # the first real frames do not pay for initialisation
+    if MODEL_WARMUP_RUNS:
+        first = runner.streams[0]
+        registry.warm_up(frame_shape=(first.height, first.width, 3),
+                         batch_sizes=(1, min(len(runner.streams), args.batch_size)), runs=MODEL_WARMUP_RUNS)
+    print(registry.report(), file=sys.stderr)
+    for name, timing in registry.timings.items():
+        for key, seconds in timing.items():
+            metrics.gauge("all", f"{name}_model_{key}", lambda seconds=seconds: seconds)
+
+    # 3. Main Loop (until every source ends or 'q' is pressed)
+    handlers = []
+    results_file = None
+    publisher = None
+    if args.headless or args.results:
+        results_file = open(args.results, "w") if args.results else sys.stdout
+
+        def write_decision(decision):
+            if args.changes_only and not decision["changed"]:
+                return
+            results_file.write(json.dumps(decision) + "\n")
+            results_file.flush()
+
+        handlers.append(write_decision)
+    if args.controller:
+        host, port = args.controller.rsplit(":", 1)
+        try:
+            publisher = SignalPublisher(host, int(port), intersection=intersection).start()
+        except IOError as e:
+            print(f"Error: {e}")
+            runner.stop()
+            exit()
+        handlers.append(publisher.publish)
+    if args.plan:
+        phases = phases or [(stream.name, [stream.name]) for stream in runner.streams]
+
+        def on_plan(plan):
+            print(f"Cycle {plan.cycle}s: " + ", ".join(f"{name} {green}s" for name, green in plan.greens.items()),
+                  file=sys.stderr)
+            if publisher is not None:
+                publisher.publish_plan(plan)
+
+        planner = CyclePlanner(PhaseOptimizer(phases, args.plan), on_plan)
+        handlers.append(planner.add)
+    stats = None
+    if args.stats:
+        stats = StatsAggregator(args.stats)
+        handlers.append(stats.add)
+
+    def on_decision(decision):
+        for handler in handlers:
+            handler(decision)
+
+    metrics_server = metrics.serve(args.metrics_port) if args.metrics_port else None
+    metrics_dump = metrics.dump_periodically(args.metrics_file, METRICS_DUMP_SECONDS) if args.metrics_file else None
+    if watcher is not None:
+        watcher.start()
+
+    try:
+        runner.run(on_decision if handlers else None)
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        if results_file is not None and results_file is not sys.stdout:
+            results_file.close()
+        if publisher is not None:
+            publisher.stop()
+        if stats is not None:
+            stats.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if metrics_dump is not None:
+            metrics_dump.set()
+            metrics.dump(args.metrics_file)
+
+
+if __name__ == "__main__":
+    main()
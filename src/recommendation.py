@@ -0,0 +1,78 @@
+import math
+import time
+
+# --- Configuration ---
+LOW_THRESHOLD = 5
+HIGH_THRESHOLD = 10
+# (status, green time in seconds) per density level
+LEVELS = [("Light Traffic", 20), ("Moderate Traffic", 45), ("Heavy Traffic", 60)]
+# Time constant of the exponential moving average over the vehicle count
+SMOOTHING_SECONDS = 3.0
+# The smoothed count must pass a threshold by this much before the level changes
+HYSTERESIS_MARGIN = 1.0
+# A level is held for at least this long before it may change again
+MIN_DWELL_SECONDS = 10.0
+
+# ---------------------
+
+
+class SmoothedRecommender:
+    """
+    Stateful version of the Light/Moderate/Heavy rule.
+
+    The raw per-frame count is smoothed with a time-based EWMA, the level only
+    moves when the smoothed count clears a threshold by HYSTERESIS_MARGIN, and
+    a new level is held for at least MIN_DWELL_SECONDS. update() returns the
+    new decision only when the level actually changes, None otherwise.
+    """
+
+    def __init__(self, low_threshold=LOW_THRESHOLD, high_threshold=HIGH_THRESHOLD,
+                 smoothing_seconds=SMOOTHING_SECONDS, margin=HYSTERESIS_MARGIN, min_dwell_seconds=MIN_DWELL_SECONDS):
+        self.bounds = [low_threshold, high_threshold]
+        self.smoothing_seconds = smoothing_seconds
+        self.margin = margin
+        self.min_dwell_seconds = min_dwell_seconds
+
+        self.smoothed = None
+        self.level = None
+        self.last_time = None
+        self.changed_at = None
+
+    def _target_level(self, value):
+        level = self.level
+        while level < len(self.bounds) and value > self.bounds[level] + self.margin:
+            level += 1
+        while level > 0 and value <= self.bounds[level - 1] - self.margin:
+            level -= 1
+        return level
+
+    def _plain_level(self, value):
+        return sum(1 for bound in self.bounds if value > bound)
+
+    def update(self, vehicle_count, now=None):
+        """Feed one frame's count. Returns (status, green_seconds) on a change, else None."""
+        now = time.time() if now is None else now
+
+        if self.smoothed is None:
+            self.smoothed = float(vehicle_count)
+            self.level = self._plain_level(self.smoothed)
+            self.last_time = self.changed_at = now
+            return self.current()
+
+        dt = max(0.0, now - self.last_time)
+        self.last_time = now
+        alpha = 1.0 - math.exp(-dt / self.smoothing_seconds) if self.smoothing_seconds > 0 else 1.0
+        self.smoothed += alpha * (vehicle_count - self.smoothed)
+
+        target = self._target_level(self.smoothed)
+        if target != self.level and now - self.changed_at >= self.min_dwell_seconds:
+            self.level = target
+            self.changed_at = now
+            return self.current()
+        return None
+
+    def current(self):
+        """The decision currently in force as (status, green_seconds), or None before the first update."""
+        if self.level is None:
+            return None
+        return LEVELS[self.level]
@@ -0,0 +1,70 @@
+import collections
+import threading
+import time
+
+
+class RingBuffer:
+    """
+    Bounded, thread-safe FIFO used to join the pipeline stages.
+
+    With drop_oldest=False a full buffer makes put() wait, so nothing is lost
+    (used for video files). With drop_oldest=True put() never waits: the oldest
+    item is discarded instead, so the consumer always gets the most recent data
+    ("latest frame wins", used for live cameras and for rendering).
+    on_drop, if given, is called with every discarded item.
+    """
+
+    def __init__(self, capacity, drop_oldest=False, on_drop=None):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.drop_oldest = drop_oldest
+        self.on_drop = on_drop
+        self.items = collections.deque()
+        self.dropped = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put(self, item, timeout=None):
+        """Add an item. Returns False if it could not be added (timeout or closed)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while len(self.items) >= self.capacity and not self.closed:
+                if self.drop_oldest:
+                    dropped = self.items.popleft()
+                    self.dropped += 1
+                    if self.on_drop is not None:
+                        self.on_drop(dropped)
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+            if self.closed:
+                return False
+            self.items.append(item)
+            self.cond.notify_all()
+            return True
+
+    def get(self, timeout=0):
+        """Return the oldest item, or None if nothing arrived within timeout."""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while not self.items:
+                remaining = deadline - time.monotonic()
+                if self.closed or remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+            item = self.items.popleft()
+            self.cond.notify_all()
+            return item
+
+    def close(self):
+        """Wake up every waiting producer and consumer; further puts are refused."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def __len__(self):
+        with self.cond:
+            return len(self.items)
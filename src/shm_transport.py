@@ -0,0 +1,251 @@
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from ring_buffer import RingBuffer
+from stream_capture import BUFFER_HEADROOM, FRAME_QUEUE_SIZE, LIVE_QUEUE_SIZE, VideoStream
+
+# --- Configuration ---
+# Slots the capture process can decode into on top of the queued frames and
+# the BUFFER_HEADROOM ones the inference process may hold at the same time
+SPARE_SLOTS = 2
+# How often blocked waits check whether the stream is being stopped
+STOP_POLL_SECONDS = 0.1
+
+# ---------------------
+
+
+class SharedFrameRing:
+    """
+    Fixed number of equally sized uint8 frame slots in one shared memory
+    block. frames[slot] is a NumPy view, so writing or reading a frame never
+    copies it between processes. Created without a name, attached with one.
+    """
+
+    def __init__(self, slots, shape, name=None):
+        size = slots * int(np.prod(shape))
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.name = self.shm.name
+        # frombuffer keeps the mapping exported for as long as any view of it exists
+        self.frames = np.frombuffer(self.shm.buf, dtype=np.uint8).reshape((slots, *shape))
+
+    def close(self):
+        self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Frames are still referenced (e.g. waiting to be rendered). The
+            # mapping stays valid and is unmapped once the last of them is gone.
+            self.shm._mmap = None
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class _StageTimes:
+    """Stands in for PipelineMetrics in the capture process; timings travel with each frame."""
+
+    def __init__(self):
+        self.times = {}
+
+    def observe(self, stream, stage, seconds):
+        self.times[stage] = self.times.get(stage, 0.0) + seconds
+
+    def pop(self):
+        times, self.times = self.times, {}
+        return times
+
+
+def _acquire_slot(free, ready, live, dropped, stop):
+    """A free slot to decode into. Live sources take back the oldest queued frame rather than wait."""
+    if live:
+        try:
+            return free.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            slot = ready.get_nowait()[0]
+            with dropped.get_lock():
+                dropped.value += 1
+            return slot
+        except queue.Empty:
+            pass
+    while not stop.is_set():
+        try:
+            return free.get(timeout=STOP_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return None
+
+
+def _capture_worker(source, stream_kwargs, conn, free, ready, dropped, stop):
+    """
+    Capture process: decodes into shared memory slots and queues only
+    (slot, frame_index, captured_at, stage times) for the inference process.
+    """
+    try:
+        stream = VideoStream(source, **stream_kwargs)
+    except IOError as e:
+        conn.send(str(e))
+        return
+    times = _StageTimes()
+    stream.metrics = times
+
+    # The first frame fixes the slot shape
+    ret, frame, raw = stream._read(None, np.empty((stream.height, stream.width, 3), dtype=np.uint8))
+    if not ret:
+        stream.cap.release()
+        conn.send(f"No frames from video source {source}")
+        return
+    conn.send((frame.shape, stream.fps, stream.live))
+    setup = conn.recv()
+    if setup is None:
+        stream.cap.release()
+        return
+
+    name, slot_count = setup
+    ring = SharedFrameRing(slot_count, frame.shape, name)
+    frame_index = 0
+    try:
+        while not stop.is_set():
+            slot = _acquire_slot(free, ready, stream.live, dropped, stop)
+            if slot is None:
+                break
+            view = ring.frames[slot]
+            if frame is None:
+                ret, frame, raw = stream._read(raw, view)
+                if not ret:
+                    break
+            if frame.ctypes.data != view.ctypes.data:
+                if frame.shape == view.shape:
+                    np.copyto(view, frame)
+                else:
+                    # The source changed resolution mid-stream
+                    cv2.resize(frame, (view.shape[1], view.shape[0]), dst=view, interpolation=cv2.INTER_AREA)
+            ready.put((slot, frame_index, time.monotonic(), times.pop()))
+            frame_index += 1
+            frame = None
+    finally:
+        ready.put(None)
+        stream.cap.release()
+        raw = frame = view = None
+        ring.close()
+
+
+class SharedFrameStream:
+    """
+    Drop-in replacement for VideoStream that decodes in a separate process.
+
+    The capture process writes decoded frames into a SharedFrameRing, and
+    only the slot index and a few numbers are sent through a queue, so no
+    frame is ever pickled. read() returns a view of the slot, which stays
+    intact until it is handed back with release(), like VideoStream's
+    buffers. When the inference side holds every slot, the capture process
+    waits for one to be released.
+
+    Live sources drop the oldest frame when inference falls behind, files
+    make the capture process wait, exactly like VideoStream. Capture and
+    preprocess times are measured in the capture process and recorded in
+    metrics here.
+    """
+
+    def __init__(self, source, name=None, queue_size=None, live=None, roi=None, max_size=None, hw_accel=True,
+                 metrics=None):
+        self.name = name or str(source)
+        self.metrics = metrics
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.free = context.Queue()
+        self.ready = context.Queue()
+        self.dropped = context.Value("q", 0)
+        self.stopped = context.Event()
+        self.process = context.Process(
+            target=_capture_worker, name=f"capture-{self.name}", daemon=True,
+            args=(source, {"name": name, "live": live, "roi": roi, "max_size": max_size, "hw_accel": hw_accel},
+                  child_conn, self.free, self.ready, self.dropped, self.stopped))
+        self.process.start()
+
+        try:
+            reply = self.conn.recv()
+        except EOFError:
+            reply = f"Capture process for {source} exited"
+        if isinstance(reply, str):
+            self.process.join()
+            raise IOError(reply)
+        shape, self.fps, self.live = reply
+        self.height, self.width = shape[:2]
+
+        if queue_size is None:
+            queue_size = LIVE_QUEUE_SIZE if self.live else FRAME_QUEUE_SIZE
+        # Frames dropped unread go straight back to the capture process
+        self.frames = RingBuffer(queue_size, drop_oldest=self.live, on_drop=lambda item: self.release(item[1]))
+        self.slot_count = queue_size + BUFFER_HEADROOM + SPARE_SLOTS
+        self.ring = SharedFrameRing(self.slot_count, shape)
+        self.ring_address = self.ring.frames.ctypes.data
+        self.slot_bytes = self.ring.frames[0].nbytes
+        self.started = False
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self._receive, name=f"receive-{self.name}", daemon=True)
+
+    def start(self):
+        for slot in range(self.slot_count):
+            self.free.put(slot)
+        self.conn.send((self.ring.name, self.slot_count))
+        self.started = True
+        self.thread.start()
+        return self
+
+    def _receive(self):
+        """Moves slot announcements from the capture process into the local frame queue."""
+        while True:
+            try:
+                item = self.ready.get(timeout=STOP_POLL_SECONDS)
+            except queue.Empty:
+                if self.stopped.is_set() or not self.process.is_alive():
+                    break
+                continue
+            if item is None:
+                break
+            slot, frame_index, captured_at, times = item
+            if self.metrics is not None:
+                for stage, seconds in times.items():
+                    self.metrics.observe(self.name, stage, seconds)
+            if not self.frames.put((frame_index, self.ring.frames[slot], captured_at)):
+                break
+        self.finished.set()
+
+    def read(self, timeout=0):
+        """Return (frame_index, frame, captured_at), or None if no new frame is ready yet."""
+        return self.frames.get(timeout)
+
+    def release(self, frame):
+        """Hand a frame from read() back, so the capture process can decode into its slot again."""
+        if frame is not None and not self.stopped.is_set():
+            self.free.put((frame.ctypes.data - self.ring_address) // self.slot_bytes)
+
+    @property
+    def dropped_frames(self):
+        return self.frames.dropped + self.dropped.value
+
+    @property
+    def done(self):
+        """True once the source has ended and every frame has been consumed."""
+        return self.finished.is_set() and len(self.frames) == 0
+
+    def stop(self):
+        self.stopped.set()
+        self.frames.close()
+        if not self.started:
+            self.conn.send(None)
+        elif self.thread.is_alive():
+            self.thread.join(timeout=1)
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.close()
+        self.ring.unlink()
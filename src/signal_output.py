@@ -0,0 +1,108 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+
+# --- Configuration ---
+CONTROLLER_HOST = "127.0.0.1"
+CONTROLLER_PORT = 9500
+# UDP has no retries, so override events are sent this many times; the
+# controller drops duplicates by sequence number
+OVERRIDE_REPEATS = 3
+
+# ---------------------
+
+
+class _SenderProtocol(asyncio.DatagramProtocol):
+    def error_received(self, exc):
+        print(f"Signal publisher error: {exc}")
+
+
+class SignalPublisher:
+    """
+    Pushes decisions to a signal controller as JSON datagrams over UDP.
+
+    Only changes are published: a "phase_change" event when a stream's
+    traffic decision changes, and "ambulance_override" start/end events when
+    priority mode begins or ends. publish_plan() sends a "phase_plan" event
+    with a multi-approach cycle plan. The asyncio loop runs on its own thread, so
+    publishing from the inference thread never blocks on the network.
+    """
+
+    def __init__(self, host=CONTROLLER_HOST, port=CONTROLLER_PORT, intersection="default",
+                 approaches=None, override_repeats=OVERRIDE_REPEATS):
+        self.address = (host, port)
+        self.intersection = intersection
+        # stream name -> (intersection, approach); unknown streams use the defaults
+        self.approaches = approaches or {}
+        self.override_repeats = override_repeats
+
+        self.sequence = itertools.count(1)
+        self.ambulance_state = {}
+        self.transport = None
+        self.error = None
+        self.ready = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name="signal-publisher", daemon=True)
+
+    def start(self):
+        """Open the socket; raises IOError if the controller address cannot be used."""
+        self.thread.start()
+        if not self.ready.wait(timeout=5):
+            self.stop()
+            raise IOError(f"Timed out opening the signal controller socket for {self.address[0]}:{self.address[1]}")
+        if self.error is not None:
+            raise IOError(f"Cannot send to signal controller {self.address[0]}:{self.address[1]}: {self.error}")
+        return self
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.transport, _ = self.loop.run_until_complete(
+                self.loop.create_datagram_endpoint(_SenderProtocol, remote_addr=self.address))
+        except Exception as e:
+            # Reported to the caller by start()
+            self.error = e
+            self.loop.close()
+            self.ready.set()
+            return
+        self.ready.set()
+        self.loop.run_forever()
+        self.transport.close()
+
+    def _send(self, event, repeats=1):
+        if self.transport is None:
+            return
+        event["seq"] = next(self.sequence)
+        event["sent_at"] = time.time()
+        payload = json.dumps(event).encode()
+        for _ in range(repeats):
+            self.loop.call_soon_threadsafe(self.transport.sendto, payload)
+
+    def publish(self, decision):
+        """Feed every decision; only changes are turned into events."""
+        stream = decision["stream"]
+        intersection, approach = self.approaches.get(stream, (self.intersection, stream))
+        base = {"intersection": intersection, "approach": approach, "frame_index": decision["frame_index"]}
+
+        was_active = self.ambulance_state.get(stream, False)
+        if decision["ambulance"] != was_active:
+            self.ambulance_state[stream] = decision["ambulance"]
+            self._send(dict(base, type="ambulance_override", state="start" if decision["ambulance"] else "end"),
+                       repeats=self.override_repeats)
+
+        if decision["changed"] and not decision["ambulance"]:
+            self._send(dict(base, type="phase_change", status=decision["status"],
+                            green_seconds=decision["green_seconds"],
+                            vehicle_count=decision["vehicle_count"]))
+
+    def publish_plan(self, plan, intersection=None):
+        """Send a PhasePlan (cycle length and green seconds per phase)."""
+        self._send({"type": "phase_plan", "intersection": intersection or self.intersection,
+                    "method": plan.method, "cycle": plan.cycle, "greens": plan.greens})
+
+    def stop(self):
+        if self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=1)
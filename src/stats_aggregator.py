@@ -0,0 +1,267 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from file_names import safe_filename
+from stream_processor import VEHICLE_CLASSES
+
+# --- Configuration ---
+STATS_MAGIC = b"TRSTAT1\0"
+# Bucket sizes, finest first; every closed bucket is rolled up into the next one
+RESOLUTIONS = [("minute", 60), ("hour", 3600), ("day", 86400)]
+# Log-scale histogram used as a mergeable quantile sketch: bin 0 holds zeros,
+# bin k > 0 holds values in (SKETCH_GAMMA^(k-2), SKETCH_GAMMA^(k-1)], so any
+# quantile is within about 5% of the true value. 100 bins reach ~9000.
+SKETCH_GAMMA = 1.1
+SKETCH_BINS = 100
+
+# One fixed-width record per approach and bucket. Everything is a sum, a max
+# or a histogram, so buckets merge by plain addition.
+BUCKET_DTYPE = np.dtype([
+    ("start", "<f8"),
+    ("frames", "<u4"),
+    ("vehicle_sum", "<f8"),
+    ("vehicle_max", "<u2"),
+    ("flow_forward", "<u4"),
+    ("flow_backward", "<u4"),
+    ("queue_sum", "<f8"),
+    ("queue_max", "<u2"),
+    ("occupancy_sum", "<f8"),
+    ("class_sums", "<f8", (len(VEHICLE_CLASSES),)),
+    ("queue_sketch", "<u4", (SKETCH_BINS,)),
+])
+
+# ---------------------
+
+_SUM_FIELDS = ["frames", "vehicle_sum", "flow_forward", "flow_backward", "queue_sum", "occupancy_sum",
+               "class_sums", "queue_sketch"]
+_MAX_FIELDS = ["vehicle_max", "queue_max"]
+
+
+def sketch_bin(value):
+    """Histogram bin of a non-negative value."""
+    if value <= 0:
+        return 0
+    return int(min(SKETCH_BINS - 1, max(1, np.ceil(np.log(value) / np.log(SKETCH_GAMMA)) + 1)))
+
+
+def sketch_quantile(sketch, q):
+    """Approximate q-quantile (0..1) from a histogram; None if it is empty."""
+    sketch = np.asarray(sketch)
+    total = sketch.sum()
+    if total == 0:
+        return None
+    k = int(np.searchsorted(np.cumsum(sketch), q * total, side="left"))
+    if k == 0:
+        return 0.0
+    # Midpoint of the bin's range, in relative terms
+    return float(2 * SKETCH_GAMMA ** (k - 1) / (SKETCH_GAMMA + 1))
+
+
+def merge_into(target, record):
+    """Add one bucket record into another, in place."""
+    for name in _SUM_FIELDS:
+        target[name] += record[name]
+    for name in _MAX_FIELDS:
+        target[name] = max(target[name], record[name])
+
+
+def rollup(records, seconds):
+    """Merge records (any resolution, duplicates allowed) into buckets of `seconds`, sorted by start."""
+    records = np.asarray(records)
+    if len(records) == 0:
+        return np.zeros(0, dtype=BUCKET_DTYPE)
+    starts = np.floor(records["start"] / seconds) * seconds
+    order = np.argsort(starts, kind="stable")
+    starts = starts[order]
+    sorted_records = records[order]
+    first = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+
+    out = np.zeros(len(first), dtype=BUCKET_DTYPE)
+    out["start"] = starts[first]
+    for name in _SUM_FIELDS:
+        out[name] = np.add.reduceat(sorted_records[name], first, axis=0)
+    for name in _MAX_FIELDS:
+        out[name] = np.maximum.reduceat(sorted_records[name], first)
+    return out
+
+
+def describe(record, bucket_seconds):
+    """Readable summary of one bucket: hourly flow, queue statistics and class mix."""
+    frames = int(record["frames"])
+    classes = record["class_sums"]
+    class_total = classes.sum()
+    return {
+        "start": float(record["start"]),
+        "frames": frames,
+        "mean_vehicles": float(record["vehicle_sum"] / frames) if frames else None,
+        "max_vehicles": int(record["vehicle_max"]),
+        "flow_per_hour": float((record["flow_forward"] + record["flow_backward"]) * 3600 / bucket_seconds),
+        "mean_queue": float(record["queue_sum"] / frames) if frames else None,
+        "max_queue": int(record["queue_max"]),
+        "queue_p50": sketch_quantile(record["queue_sketch"], 0.5),
+        "queue_p95": sketch_quantile(record["queue_sketch"], 0.95),
+        "mean_occupancy": float(record["occupancy_sum"] / frames) if frames else None,
+        "class_mix": {str(c): float(n / class_total) if class_total else 0.0
+                      for c, n in zip(VEHICLE_CLASSES, classes)},
+    }
+
+
+class BucketWriter:
+    """Appends closed buckets of one approach and resolution to a compact binary file."""
+
+    def __init__(self, path):
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab")
+        if new_file:
+            self.file.write(STATS_MAGIC)
+
+    def write(self, record):
+        self.file.write(np.asarray(record, dtype=BUCKET_DTYPE).tobytes())
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_buckets(path):
+    """Memory-mapped bucket records of a stats file (buckets written on restart may repeat a start)."""
+    with open(path, "rb") as f:
+        if f.read(len(STATS_MAGIC)) != STATS_MAGIC:
+            raise ValueError(f"{path} is not a stats file")
+    count = (os.path.getsize(path) - len(STATS_MAGIC)) // BUCKET_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=BUCKET_DTYPE)
+    return np.memmap(path, dtype=BUCKET_DTYPE, mode="r", offset=len(STATS_MAGIC), shape=(count,))
+
+
+class StatsAggregator:
+    """
+    Folds per-frame decisions into fixed-memory time buckets per approach.
+
+    Only one open bucket per approach and resolution is kept in memory. When
+    a minute ends its bucket is written out and merged into the open hour,
+    an ended hour into the open day, and so on, so the raw frames are never
+    stored or rescanned. Files are "<approach>_<resolution>.stats" in
+    directory (nothing is written without one).
+    """
+
+    def __init__(self, directory=None, resolutions=RESOLUTIONS):
+        self.directory = directory
+        self.resolutions = resolutions
+        self.open = {}
+        self.last_crossings = {}
+        self.writers = {}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def add(self, decision):
+        approach = decision["stream"]
+        now = decision["timestamp"]
+
+        lanes = decision.get("lanes")
+        if lanes:
+            queue = sum(lane["queue_length"] for lane in lanes)
+            occupancy = sum(lane["occupancy"] for lane in lanes) / len(lanes)
+        else:
+            queue, occupancy = decision["vehicle_count"], 0.0
+
+        # Line counters are running totals; the bucket gets the increase. A
+        # total that went down means the counter was recreated (e.g. the
+        # counting lines were edited), so everything since then is new.
+        forward = backward = 0
+        if decision.get("line_counts"):
+            totals = decision["line_counts"].values()
+            crossings = (sum(t["forward"] for t in totals), sum(t["backward"] for t in totals))
+            previous = self.last_crossings.get(approach, crossings)
+            forward, backward = (now_total - last if now_total >= last else now_total
+                                 for now_total, last in zip(crossings, previous))
+            self.last_crossings[approach] = crossings
+
+        record = self._bucket(approach, 0, now)
+        record["frames"] += 1
+        record["vehicle_sum"] += decision["vehicle_count"]
+        record["vehicle_max"] = max(record["vehicle_max"], decision["vehicle_count"])
+        record["flow_forward"] += forward
+        record["flow_backward"] += backward
+        record["queue_sum"] += queue
+        record["queue_max"] = max(record["queue_max"], queue)
+        record["occupancy_sum"] += occupancy
+        for i, class_id in enumerate(VEHICLE_CLASSES):
+            record["class_sums"][i] += decision.get("class_counts", {}).get(str(class_id), 0)
+        record["queue_sketch"][sketch_bin(queue)] += 1
+
+    def _bucket(self, approach, level, now):
+        """The open bucket at this resolution for `now`, closing the previous one if it ended."""
+        seconds = self.resolutions[level][1]
+        start = np.floor(now / seconds) * seconds
+        record = self.open.get((approach, level))
+        if record is not None and record["start"] != start:
+            self._close(approach, level)
+            record = None
+        if record is None:
+            record = np.zeros((), dtype=BUCKET_DTYPE)
+            record["start"] = start
+            self.open[(approach, level)] = record
+        return record
+
+    def _close(self, approach, level):
+        record = self.open.pop((approach, level))
+        if self.directory is not None:
+            self._writer(approach, level).write(record)
+        if level + 1 < len(self.resolutions):
+            merge_into(self._bucket(approach, level + 1, float(record["start"])), record)
+
+    def _writer(self, approach, level):
+        key = (approach, level)
+        if key not in self.writers:
+            name = f"{safe_filename(approach)}_{self.resolutions[level][0]}.stats"
+            self.writers[key] = BucketWriter(os.path.join(self.directory, name))
+        return self.writers[key]
+
+    def current(self, approach, level=0):
+        """Summary of the open bucket (e.g. the current minute) of one approach, or None."""
+        record = self.open.get((approach, level))
+        return describe(record, self.resolutions[level][1]) if record is not None else None
+
+    def flush(self):
+        """Write out every open bucket (finest first, so each one is rolled up before its parent)."""
+        for level in range(len(self.resolutions)):
+            for approach, open_level in list(self.open):
+                if open_level == level:
+                    self._close(approach, level)
+
+    def close(self):
+        self.flush()
+        for writer in self.writers.values():
+            writer.close()
+        self.writers.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise stored traffic statistics.")
+    parser.add_argument("directory")
+    parser.add_argument("--resolution", default="hour", help="Stored resolution to read (minute, hour, day).")
+    parser.add_argument("--bucket-seconds", type=int, help="Roll the stored buckets up to this size first.")
+    parser.add_argument("--since", type=float, help="Only buckets starting at or after this Unix time.")
+    args = parser.parse_args()
+
+    seconds = dict(RESOLUTIONS)[args.resolution]
+    for path in sorted(glob.glob(os.path.join(args.directory, f"*_{args.resolution}.stats"))):
+        records = read_buckets(path)
+        if args.since is not None:
+            records = records[records["start"] >= args.since]
+        bucket_seconds = args.bucket_seconds or seconds
+        print(os.path.basename(path))
+        for record in rollup(records, bucket_seconds):
+            row = describe(record, bucket_seconds)
+            stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["start"]))
+            print(f"  {stamp}  flow/h {row['flow_per_hour']:7.0f}  queue mean {row['mean_queue'] or 0:5.1f}"
+                  f"  p95 {row['queue_p95'] or 0:5.1f}  max {row['max_queue']:3d}")
+
+
+if __name__ == "__main__":
+    main()
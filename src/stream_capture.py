@@ -0,0 +1,202 @@
+import collections
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from ring_buffer import RingBuffer
+
+# --- Configuration ---
+# How many decoded frames a capture thread may keep ahead of inference.
+# Keep this at least as large as the inference batch size.
+FRAME_QUEUE_SIZE = 8
+# Live sources only keep the newest frame, so decisions never lag behind the camera
+LIVE_QUEUE_SIZE = 1
+# Frame buffers preallocated on top of the queue size, for frames that are
+# being batched, inferred or rendered (more are allocated if needed)
+BUFFER_HEADROOM = 16
+
+# ---------------------
+
+
+def parse_source(source):
+    """'0' -> 0 (webcam index), anything else (file path, rtsp://...) unchanged."""
+    if isinstance(source, str) and source.strip().isdigit():
+        return int(source.strip())
+    return source
+
+
+def is_live_source(source):
+    """Webcams and network streams are live; anything else is treated as a file."""
+    if isinstance(source, int):
+        return True
+    return str(source).lower().startswith(("rtsp://", "rtmp://", "http://", "https://", "udp://", "tcp://"))
+
+
+def open_capture(source, hw_accel=True):
+    """
+    Open a VideoCapture, asking FFmpeg for hardware-accelerated decoding when
+    this OpenCV build supports it, and falling back to plain OpenCV otherwise.
+    """
+    if hw_accel and not isinstance(source, int) and hasattr(cv2, "VIDEO_ACCELERATION_ANY"):
+        try:
+            cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG,
+                                   [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+            if cap.isOpened():
+                return cap
+            cap.release()
+        except cv2.error:
+            pass
+    return cv2.VideoCapture(source)
+
+
+class VideoStream:
+    """
+    Reads one video source on its own thread so several cameras can be
+    decoded in parallel while a single inference loop consumes them.
+
+    Live sources drop old frames when inference falls behind (latest frame
+    wins); files are never skipped, the capture thread waits instead.
+
+    The capture thread can also crop to a region of interest, given as
+    (x, y, w, h), and downscale so the longest side is at most max_size, once,
+    before the frame is queued, so width/height (and any zones or lines)
+    refer to the processed frame.
+
+    Frames are decoded into a pool of preallocated buffers instead of a new
+    array per frame. A buffer is only reused after the consumer hands the
+    frame back with release(); frames that are never released are simply
+    left to the garbage collector.
+
+    Every queued frame carries its capture time (time.monotonic()); with a
+    PipelineMetrics, decode and crop/resize times are recorded as the
+    "capture" and "preprocess" stages.
+    """
+
+    def __init__(self, source, name=None, queue_size=None, live=None, roi=None, max_size=None, hw_accel=True,
+                 metrics=None):
+        self.source = parse_source(source)
+        self.name = name or str(source)
+        self.metrics = metrics
+        self.cap = open_capture(self.source, hw_accel)
+        if not self.cap.isOpened():
+            raise IOError(f"Cannot open video source {source}")
+
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        source_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        source_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        # Region of interest and output size, computed once
+        self.roi = None
+        if roi is not None:
+            x, y, w, h = (int(v) for v in roi)
+            if source_width and source_height:
+                x, y = min(max(x, 0), source_width - 1), min(max(y, 0), source_height - 1)
+                w, h = min(w, source_width - x), min(h, source_height - y)
+            self.roi = (x, y, w, h)
+        roi_width, roi_height = (self.roi[2], self.roi[3]) if self.roi else (source_width, source_height)
+        scale = 1.0
+        if max_size and max(roi_width, roi_height) > max_size:
+            scale = max_size / max(roi_width, roi_height)
+        self.width = max(1, int(round(roi_width * scale)))
+        self.height = max(1, int(round(roi_height * scale)))
+        self.resize = scale != 1.0
+
+        self.live = is_live_source(self.source) if live is None else live
+        if queue_size is None:
+            queue_size = LIVE_QUEUE_SIZE if self.live else FRAME_QUEUE_SIZE
+        # Frames dropped unread go straight back to the pool
+        self.frames = RingBuffer(queue_size, drop_oldest=self.live, on_drop=lambda item: self.release(item[1]))
+        self.buffer_count = queue_size + BUFFER_HEADROOM
+        self.free_buffers = collections.deque()
+        self.buffer_shape = None
+        self.stopped = threading.Event()
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"capture-{self.name}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _buffer(self, shape):
+        """A free frame buffer from the pool, which is filled on first use."""
+        if shape != self.buffer_shape:
+            self.buffer_shape = shape
+            self.free_buffers = collections.deque(np.empty(shape, dtype=np.uint8) for _ in range(self.buffer_count))
+        try:
+            return self.free_buffers.popleft()
+        except IndexError:
+            # Every buffer is still in use downstream
+            return np.empty(shape, dtype=np.uint8)
+
+    def release(self, frame):
+        """Hand a frame from read() back for reuse. Only call it once nothing refers to the frame any more."""
+        if frame is not None and frame.shape == self.buffer_shape:
+            self.free_buffers.append(frame)
+
+    def _read(self, raw, buffer=None):
+        """
+        Decode one frame into buffer, or the next pooled buffer if not given.
+        Returns (ret, frame, raw decode buffer).
+        """
+        start = time.perf_counter()
+        if self.roi is None and not self.resize:
+            # Decode straight into the pooled buffer
+            if buffer is None and raw is not None:
+                buffer = self._buffer(raw.shape)
+            ret, frame = self.cap.read(buffer)
+            if ret and self.metrics is not None:
+                self.metrics.observe(self.name, "capture", time.perf_counter() - start)
+            return ret, frame, frame
+
+        ret, raw = self.cap.read(raw)
+        if not ret:
+            return False, None, raw
+        decoded = time.perf_counter()
+        view = raw
+        if self.roi is not None:
+            x, y, w, h = self.roi
+            view = raw[y:y + h, x:x + w]  # a view, no copy
+        if buffer is None:
+            buffer = self._buffer((self.height, self.width, raw.shape[2]))
+        if self.resize:
+            cv2.resize(view, (self.width, self.height), dst=buffer, interpolation=cv2.INTER_AREA)
+        else:
+            np.copyto(buffer, view)
+        if self.metrics is not None:
+            self.metrics.observe(self.name, "capture", decoded - start)
+            self.metrics.observe(self.name, "preprocess", time.perf_counter() - decoded)
+        return True, buffer, raw
+
+    def _run(self):
+        frame_index = 0
+        raw = None
+        while not self.stopped.is_set():
+            ret, frame, raw = self._read(raw)
+            if not ret:
+                break
+            # Files wait here while the buffer is full; live sources drop the oldest frame
+            self.frames.put((frame_index, frame, time.monotonic()))
+            frame_index += 1
+        self.finished.set()
+        self.cap.release()
+
+    def read(self, timeout=0):
+        """Return (frame_index, frame, captured_at), or None if no new frame is ready yet."""
+        return self.frames.get(timeout)
+
+    @property
+    def dropped_frames(self):
+        return self.frames.dropped
+
+    @property
+    def done(self):
+        """True once the source has ended and every frame has been consumed."""
+        return self.finished.is_set() and len(self.frames) == 0
+
+    def stop(self):
+        self.stopped.set()
+        self.frames.close()
+        if self.thread.is_alive():
+            self.thread.join(timeout=1)
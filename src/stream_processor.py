@@ -0,0 +1,222 @@
+import time
+
+import cv2
+import numpy as np
+
+from emergency_state import OVERRIDE
+from recommendation import HIGH_THRESHOLD, LOW_THRESHOLD, SmoothedRecommender
+
+# --- Configuration ---
+AMBULANCE_PRIORITY_SECONDS = 20
+
+# COCO class IDs for vehicles: car=2, motorcycle=3, bus=5, truck=7
+VEHICLE_CLASSES = [2, 3, 5, 7]
+
+STATUS_COLORS = {
+    "AMBULANCE DETECTED": (0, 0, 255),
+    "Light Traffic": (0, 255, 0),
+    "Moderate Traffic": (0, 255, 255),
+    "Heavy Traffic": (0, 0, 255),
+}
+
+# ---------------------
+
+
+def classify_traffic(vehicle_count, low_threshold=LOW_THRESHOLD, high_threshold=HIGH_THRESHOLD):
+    """Map a single raw vehicle count to (status, recommendation), without smoothing."""
+    if vehicle_count <= low_threshold:
+        return "Light Traffic", "Green Time: 20s"
+    elif vehicle_count <= high_threshold:
+        return "Moderate Traffic", "Green Time: 45s"
+    else:
+        return "Heavy Traffic", "Green Time: 60s"
+
+
+class StreamProcessor:
+    """
+    Decision state for one camera: ambulance priority timer, tracker and
+    the last traffic decision. The models themselves are shared and live
+    outside this class.
+
+    Traffic decisions go through a SmoothedRecommender, so a single missed
+    detection does not flip the green time; decision()["changed"] marks the
+    frames where the published decision actually changes.
+
+    emergency is an optional EmergencyStateMachine that decides when the
+    ambulance priority override starts and ends.
+
+    Every `now` argument defaults to the current time. Callers that process
+    frames late or in batches should pass the time each frame was captured,
+    so smoothing, dwell times and timers follow the video, not the pipeline.
+    """
+
+    def __init__(self, name, tracker, scheduler=None, line_counter=None, zone_map=None,
+                 low_threshold=LOW_THRESHOLD, high_threshold=HIGH_THRESHOLD,
+                 priority_seconds=AMBULANCE_PRIORITY_SECONDS, vehicle_classes=VEHICLE_CLASSES,
+                 recommender_kwargs=None, emergency=None):
+        self.name = name
+        self.tracker = tracker
+        self.scheduler = scheduler
+        self.line_counter = line_counter
+        self.zone_map = zone_map
+        self.emergency = emergency
+        self.lane_stats = None
+        self.recommender = SmoothedRecommender(low_threshold, high_threshold, **(recommender_kwargs or {}))
+        self.last_published = None
+        self.priority_seconds = priority_seconds
+        self.vehicle_classes = set(vehicle_classes)
+
+        self.ambulance_detected_time = None
+        self.ambulance_present = False
+        self.priority_active = False
+        self.vehicle_count = 0
+        self.class_counts = {}
+
+    def should_run_ambulance(self, frame_index, now=None):
+        """Ask the scheduler whether the ambulance model has to see this frame."""
+        return self.scheduler is None or self.scheduler.should_run(frame_index, now)
+
+    def update_ambulance(self, ambulance_result, now=None):
+        """
+        Feed the ambulance detections for this frame, or None if the ambulance
+        model was skipped for it (the last known state is kept).
+        Returns True while the priority override is active.
+
+        With an EmergencyStateMachine the override follows one confirmed,
+        approaching vehicle instead of running a fixed timer from the first
+        detection.
+        """
+        now = time.time() if now is None else now
+        if ambulance_result is not None:
+            self.ambulance_present = len(ambulance_result.boxes) > 0
+            if self.scheduler is not None:
+                self.scheduler.observe_ambulance(ambulance_result)
+
+        if self.emergency is not None:
+            # Confirmed, approaching vehicles only; released as soon as it clears
+            if ambulance_result is not None:
+                state = self.emergency.update(ambulance_result.boxes.xyxy.cpu().numpy(), now)
+            else:
+                state = self.emergency.tick(now)
+            self.priority_active = state == OVERRIDE
+            return self.priority_active
+
+        self.priority_active = False
+        if self.ambulance_present:
+            if self.ambulance_detected_time is None:
+                self.ambulance_detected_time = now
+            if now - self.ambulance_detected_time < self.priority_seconds:
+                self.priority_active = True
+            else:
+                self.ambulance_detected_time = None
+        else:
+            self.ambulance_detected_time = None
+
+        return self.priority_active
+
+    def track(self, general_result):
+        """Run this stream's tracker on a raw detection result."""
+        if self.scheduler is not None:
+            self.scheduler.observe_general(general_result)
+        return self.tracker.update(general_result)
+
+    def update_traffic(self, tracked_result, frame_index=0, now=None):
+        """Count vehicles in a tracked result and feed the recommender, line counter and queue zones."""
+        self.vehicle_count = 0
+        self.class_counts = {}
+        track_ids, boxes = np.empty(0), np.empty((0, 4))
+        if tracked_result.boxes is not None and tracked_result.boxes.id is not None:
+            class_ids = tracked_result.boxes.cls.int().cpu().numpy()
+            is_vehicle = np.isin(class_ids, list(self.vehicle_classes))
+            self.vehicle_count = int(is_vehicle.sum())
+            present, counts = np.unique(class_ids[is_vehicle], return_counts=True)
+            self.class_counts = {str(c): int(n) for c, n in zip(present, counts)}
+            track_ids = tracked_result.boxes.id.int().cpu().numpy()[is_vehicle]
+            boxes = tracked_result.boxes.xywh.cpu().numpy()[is_vehicle]
+
+        self.recommender.update(self.vehicle_count, now)
+        if self.line_counter is not None:
+            self.line_counter.update(frame_index, track_ids, boxes[:, :2])
+        if self.zone_map is not None:
+            self.lane_stats = self.zone_map.update(track_ids, boxes, now)
+        return self.vehicle_count
+
+    def decision(self, frame_index=None, now=None, priority_active=None):
+        """
+        Structured output for the current frame. priority_active can be given
+        explicitly when several frames of this stream are processed as a batch.
+        """
+        now = time.time() if now is None else now
+        if priority_active is None:
+            priority_active = self.priority_active
+        if priority_active:
+            status, recommendation = "AMBULANCE DETECTED", "IMMEDIATE GREEN LIGHT"
+            green_seconds = None
+            if self.emergency is not None:
+                remaining = self.emergency.remaining(now) or 0.0
+            else:
+                remaining = max(0.0, self.priority_seconds - (now - self.ambulance_detected_time))
+        elif self.recommender.current() is not None:
+            status, green_seconds = self.recommender.current()
+            recommendation = f"Green Time: {green_seconds}s"
+            remaining = None
+        else:
+            status, recommendation = classify_traffic(self.vehicle_count, *self.recommender.bounds)
+            green_seconds = None
+            remaining = None
+
+        return {
+            "stream": self.name,
+            "frame_index": frame_index,
+            "timestamp": now,
+            "vehicle_count": self.vehicle_count,
+            "class_counts": self.class_counts,
+            "smoothed_count": round(self.recommender.smoothed, 2) if self.recommender.smoothed is not None else None,
+            "status": status,
+            "recommendation": recommendation,
+            "green_seconds": green_seconds,
+            "ambulance": priority_active,
+            "priority_remaining": remaining,
+            "emergency": self.emergency.info() if self.emergency is not None else None,
+            "line_counts": self.line_counter.totals() if self.line_counter is not None else None,
+            "lanes": self.lane_stats,
+            "changed": False,
+        }
+
+    def publish(self, decision):
+        """
+        Mark whether a decision differs from the last one published for this
+        stream. Must be called in frame order.
+        """
+        key = (decision["status"], decision["recommendation"])
+        decision["changed"] = key != self.last_published
+        self.last_published = key
+        return decision
+
+
+def annotate_frame(frame, decision, ambulance_result=None, general_result=None):
+    """Draw detections and the decision text onto a copy of the frame."""
+    final_frame = frame.copy()
+    color = STATUS_COLORS.get(decision["status"], (255, 255, 255))
+
+    if ambulance_result is not None:
+        for box in ambulance_result.boxes:
+            x1, y1, x2, y2 = map(int, box.xyxy[0])
+            cls_name = ambulance_result.names[int(box.cls[0])]
+            conf = float(box.conf[0])
+            cv2.rectangle(final_frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+            cv2.putText(final_frame, f"{cls_name} {conf:.2f}", (x1, y1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+    if decision["ambulance"]:
+        timer_text = f"Priority Timer: {int(decision['priority_remaining'])}s"
+        cv2.putText(final_frame, timer_text, (50, 170), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+    elif general_result is not None:
+        final_frame = general_result.plot(img=final_frame)
+        cv2.putText(final_frame, f"Total Vehicle Count: {decision['vehicle_count']}", (50, 50),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+
+    cv2.putText(final_frame, f"Status: {decision['status']}", (50, 90), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+    cv2.putText(final_frame, f"Recommendation: {decision['recommendation']}", (50, 130),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+    return final_frame
@@ -0,0 +1,140 @@
+import math
+
+import numpy as np
+
+# --- Configuration ---
+# Points kept per track (older points are overwritten)
+HISTORY_LENGTH = 30
+# Tracks not updated for this long are evicted
+MAX_TRACK_AGE_SECONDS = 2.0
+# Below this speed (pixels per second) a vehicle counts as stopped
+STOP_SPEED_THRESHOLD = 5.0
+# Initial number of track slots; grows automatically if more tracks are alive at once
+INITIAL_CAPACITY = 256
+
+# ---------------------
+
+
+class TrackStore:
+    """
+    Bounded trajectory store for all tracks of one camera.
+
+    Struct-of-arrays layout: every track owns one slot, and each slot is a
+    fixed-size ring buffer of (x, y, time) samples. Appending is O(1) with no
+    list shifting, finished tracks are evicted by age and their slots reused,
+    and speed, heading and stop duration are computed on demand from the
+    buffered samples.
+    """
+
+    def __init__(self, history_length=HISTORY_LENGTH, max_age_seconds=MAX_TRACK_AGE_SECONDS,
+                 capacity=INITIAL_CAPACITY):
+        self.history_length = history_length
+        self.max_age_seconds = max_age_seconds
+
+        self.points = np.zeros((capacity, history_length, 2), dtype=np.float32)
+        self.times = np.zeros((capacity, history_length), dtype=np.float64)
+        self.heads = np.zeros(capacity, dtype=np.int64)  # next write position
+        self.lengths = np.zeros(capacity, dtype=np.int64)
+        self.last_time = np.zeros(capacity, dtype=np.float64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.slot_ids = np.full(capacity, -1, dtype=np.int64)
+
+        self.slots = {}  # track_id -> slot
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def _grow(self):
+        old = len(self.active)
+        new = old * 2
+        self.points = np.concatenate([self.points, np.zeros((old, self.history_length, 2), dtype=np.float32)])
+        self.times = np.concatenate([self.times, np.zeros((old, self.history_length), dtype=np.float64)])
+        self.heads = np.concatenate([self.heads, np.zeros(old, dtype=np.int64)])
+        self.lengths = np.concatenate([self.lengths, np.zeros(old, dtype=np.int64)])
+        self.last_time = np.concatenate([self.last_time, np.zeros(old, dtype=np.float64)])
+        self.active = np.concatenate([self.active, np.zeros(old, dtype=bool)])
+        self.slot_ids = np.concatenate([self.slot_ids, np.full(old, -1, dtype=np.int64)])
+        self.free.extend(range(new - 1, old - 1, -1))
+
+    def _slot(self, track_id):
+        slot = self.slots.get(track_id)
+        if slot is None:
+            if not self.free:
+                self._grow()
+            slot = self.free.pop()
+            self.slots[track_id] = slot
+            self.slot_ids[slot] = track_id
+            self.heads[slot] = 0
+            self.lengths[slot] = 0
+            self.active[slot] = True
+        return slot
+
+    def update(self, track_ids, centers, now):
+        """Append one (x, y) sample per track for time `now` (seconds), then evict stale tracks."""
+        track_ids = [int(tid) for tid in track_ids]
+        if track_ids:
+            slots = np.array([self._slot(tid) for tid in track_ids], dtype=np.int64)
+            heads = self.heads[slots]
+            self.points[slots, heads] = np.asarray(centers, dtype=np.float32).reshape(-1, 2)
+            self.times[slots, heads] = now
+            self.heads[slots] = (heads + 1) % self.history_length
+            self.lengths[slots] = np.minimum(self.lengths[slots] + 1, self.history_length)
+            self.last_time[slots] = now
+        self.evict(now)
+
+    def evict(self, now):
+        """Free the slots of tracks not seen for max_age_seconds."""
+        stale = np.nonzero(self.active & (now - self.last_time > self.max_age_seconds))[0]
+        for slot in stale:
+            del self.slots[int(self.slot_ids[slot])]
+            self.slot_ids[slot] = -1
+            self.active[slot] = False
+            self.free.append(int(slot))
+
+    def __contains__(self, track_id):
+        return track_id in self.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _ordered(self, track_id):
+        """(points, times) of a track, oldest first."""
+        slot = self.slots[track_id]
+        length = self.lengths[slot]
+        order = (self.heads[slot] - length + np.arange(length)) % self.history_length
+        return self.points[slot, order], self.times[slot, order]
+
+    def trail(self, track_id):
+        """Track points as an int32 (N, 1, 2) array, ready for cv2.polylines."""
+        points, _ = self._ordered(track_id)
+        return points.astype(np.int32).reshape(-1, 1, 2)
+
+    def speed(self, track_id, window=5):
+        """Average speed in pixels per second over the last `window` samples."""
+        points, times = self._ordered(track_id)
+        points, times = points[-window:], times[-window:]
+        if len(points) < 2 or times[-1] <= times[0]:
+            return 0.0
+        distance = np.linalg.norm(np.diff(points, axis=0), axis=1).sum()
+        return float(distance / (times[-1] - times[0]))
+
+    def heading(self, track_id, window=5):
+        """Direction of travel in degrees (0 = right, 90 = down in image coordinates), or None."""
+        points, _ = self._ordered(track_id)
+        points = points[-window:]
+        if len(points) < 2:
+            return None
+        dx, dy = points[-1] - points[0]
+        if dx == 0 and dy == 0:
+            return None
+        return math.degrees(math.atan2(dy, dx)) % 360
+
+    def stop_duration(self, track_id, speed_threshold=STOP_SPEED_THRESHOLD):
+        """Seconds the track has been moving slower than speed_threshold (limited by the history length)."""
+        points, times = self._ordered(track_id)
+        if len(points) < 2:
+            return 0.0
+        steps = np.linalg.norm(np.diff(points, axis=0), axis=1)
+        dt = np.maximum(np.diff(times), 1e-6)
+        moving = np.nonzero(steps / dt >= speed_threshold)[0]
+        # Samples after the last moving step are the stopped ones
+        first_stopped = moving[-1] + 1 if len(moving) else 0
+        return float(times[-1] - times[first_stopped])
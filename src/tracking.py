@@ -0,0 +1,40 @@
+import torch
+from ultralytics.trackers.track import TRACKER_MAP
+from ultralytics.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.utils.checks import check_yaml
+
+# --- Configuration ---
+# Same default tracker that YOLO.track() uses
+TRACKER_CONFIG = "botsort.yaml"
+
+# ---------------------
+
+
+class StreamTracker:
+    """
+    One tracker per camera.
+
+    YOLO.track(persist=True) keeps a single tracker inside the model, so sharing
+    one model between cameras would mix their track IDs. Instead we run plain
+    detection on the shared model and keep the tracker state here, per stream.
+    """
+
+    def __init__(self, frame_rate=30, tracker_config=TRACKER_CONFIG):
+        cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker_config)))
+        self.tracker = TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=int(frame_rate))
+
+    def update(self, result):
+        """Attach track IDs to a detection result, like YOLO.track() does."""
+        det = result.boxes.cpu().numpy()
+        tracks = self.tracker.update(det, result.orig_img)
+        if len(tracks) == 0:
+            # Nothing tracked: boxes.id stays None, same as model.track()
+            return result
+
+        idx = tracks[:, -1].astype(int)
+        result = result[idx]
+        result.update(boxes=torch.as_tensor(tracks[:, :-1]))
+        return result
+
+    def reset(self):
+        self.tracker.reset()